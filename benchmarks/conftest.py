@@ -0,0 +1,75 @@
+import dash
+import pharmpy
+import pytest
+from pharmpy.modeling import load_example_model
+
+from modelbuilder.internals.help_functions import _render_cache, _view_cache
+from modelbuilder.internals.model_state import _dataset_cache, _stage_cache, _state_cache
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    # Saved with the results so that regressions can be traced to a pharmpy (or dash) upgrade
+    output_json['versions'] = {'pharmpy': pharmpy.__version__, 'dash': dash.__version__}
+
+
+def clear_caches():
+    # Benchmarks of a cold start, i.e. the first time a model is generated or rendered
+    _stage_cache.clear()
+    _state_cache.clear()
+    _dataset_cache.clear()
+    _render_cache.clear()
+    _view_cache.clear()
+
+
+@pytest.fixture(scope='session')
+def pheno():
+    model = load_example_model('pheno')
+    return model.dataset, model.datainfo
+
+
+class DashClient:
+    # Calls the callbacks of the app the same way as the browser does, i.e. through the
+    # _dash-update-component endpoint of the Flask server
+    def __init__(self, app):
+        self.client = app.server.test_client()
+        self.client.get('/')
+        self.dependencies = self.client.get('/_dash-dependencies').json
+
+    def call(self, output, inputs, state=None, triggered=None):
+        dependency = self._find(output, inputs)
+        state = state or {}
+        body = {
+            'output': dependency['output'],
+            'outputs': _get_outputs(dependency['output']),
+            'inputs': [_with_value(i, inputs) for i in dependency['inputs']],
+            'state': [_with_value(s, state) for s in dependency['state']],
+            'changedPropIds': triggered or list(inputs),
+        }
+        response = self.client.post('/_dash-update-component', json=body)
+        if response.status_code == 204:
+            return None
+        assert response.status_code == 200, response.data
+        return response.json['response']
+
+    def _find(self, output, inputs):
+        input_ids = {key.split('.')[0] for key in inputs}
+        for dependency in self.dependencies:
+            if output not in dependency['output']:
+                continue
+            if input_ids <= {i['id'] for i in dependency['inputs']}:
+                return dependency
+        raise KeyError(f'No callback with output {output} and inputs {input_ids}')
+
+
+def _get_outputs(output):
+    outputs = []
+    for prop_id in output.strip('.').split('...'):
+        component_id, prop = prop_id.split('@')[0].rsplit('.', 1)
+        outputs.append({'id': component_id, 'property': prop})
+    if not output.startswith('..'):
+        return outputs[0]
+    return outputs
+
+
+def _with_value(dependency, values):
+    return dict(dependency, value=values.get(f"{dependency['id']}.{dependency['property']}"))
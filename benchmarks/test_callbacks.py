@@ -0,0 +1,79 @@
+import pytest
+
+from conftest import DashClient, clear_caches
+from modelbuilder.internals.session import new_session_id
+
+
+@pytest.fixture(scope='module')
+def client():
+    from modelbuilder.app import app
+
+    return DashClient(app)
+
+
+@pytest.fixture(scope='module')
+def contents(pheno):
+    dataset, _ = pheno
+    return dataset.to_csv(index=False).encode('utf-8')
+
+
+def edits(*triggered):
+    return {'triggered': list(triggered), 'time': 0}
+
+
+def run_session(client, contents):
+    # A user building a model: load a dataset, change route and peripherals, add an IIV block
+    # and a covariate and edit a parameter. The model code is rendered after each change, as
+    # the browser does when the model state token changes.
+    session = {'session-id.data': new_session_id()}
+
+    def change(output, inputs, state=None, triggered=None):
+        response = client.call(output, inputs, {**session, **(state or {})}, triggered)
+        client.call(
+            'output-model',
+            {'model-state-token.data': new_session_id(), 'model-view-tabs.value': 'output-model'},
+            session,
+        )
+        return response
+
+    response = client.client.post('/_modelbuilder/datasets?filename=pheno.csv', data=contents)
+    client.call('dataset-path', {'dataset-upload.data': response.json}, session)
+    change('model-state-token', {'route-radio.value': 'oral'}, {'modelformat.value': 'nonmem'})
+    change('model-state-token', {'peripheral-radio.value': 1})
+
+    iiv = client.call('iiv_table', {'all-tabs.value': 'par-var-tab'}, session)['iiv_table']
+    data = [{**row, **{key: 'True' for key in row if key.startswith('CL')}} for row in iiv['data']]
+    change(
+        'model-state-token',
+        {'iiv_table-edits.data': edits('data', 'selected_rows')},
+        {
+            'iiv_table.data': data,
+            'iiv_table.selected_rows': list(range(len(data))),
+            'iov_table.data': [],
+            'iov_table.selected_rows': [],
+        },
+    )
+
+    covariate = {'parameter': 'CL', 'covariate': 'WGT', 'effect': 'exp', 'operation': '*'}
+    change(
+        'model-state-token',
+        {'cov_table-edits.data': edits('data', 'selected_rows'), 'error_message.children': ''},
+        {'cov_table.data': [covariate], 'cov_table.selected_rows': [0]},
+        triggered=['cov_table-edits.data'],
+    )
+
+    parameters = client.call('parameter-table', {'all-tabs.value': 'parameters-tab'}, session)
+    data = parameters['parameter-table']['data']
+    data[0]['init'] = data[0]['init'] * 2
+    change(
+        'model-state-token',
+        {'parameter-table-edits.data': edits('data'), 'all-tabs.value': 'parameters-tab'},
+        {'parameter-table.data': data},
+        triggered=['parameter-table-edits.data'],
+    )
+
+
+@pytest.mark.parametrize('cached', [False, True], ids=['cold', 'cached'])
+def test_callback_sequence(benchmark, client, contents, cached):
+    setup = None if cached else clear_caches
+    benchmark.pedantic(run_session, args=(client, contents), setup=setup, rounds=3)
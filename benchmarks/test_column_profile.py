@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modelbuilder.internals.column_profile import profile_columns
+
+ROUNDS = 5
+N_IDS = 20_000
+ROWS_PER_ID = 100
+
+
+@pytest.fixture(scope='module')
+def large_dataset():
+    rng = np.random.default_rng(0)
+    n = N_IDS * ROWS_PER_ID
+    ids = np.repeat(np.arange(1, N_IDS + 1), ROWS_PER_ID)
+    wgt = rng.normal(70, 10, N_IDS)
+    df = pd.DataFrame(
+        {
+            'ID': ids,
+            'TIME': np.tile(np.arange(ROWS_PER_ID, dtype=float), N_IDS),
+            'AMT': np.where(np.arange(n) % ROWS_PER_ID == 0, 100.0, 0.0),
+            'DV': rng.lognormal(0, 1, n),
+            'WGT': np.repeat(wgt, ROWS_PER_ID),
+            'AGE': np.repeat(rng.integers(18, 90, N_IDS), ROWS_PER_ID),
+            'SEX': np.repeat(rng.integers(0, 2, N_IDS), ROWS_PER_ID),
+            'OCC': np.tile(np.repeat(np.arange(1, 5), ROWS_PER_ID // 4), N_IDS),
+        }
+    )
+    types = {'ID': 'id', 'TIME': 'idv', 'AMT': 'dose', 'DV': 'dv'}
+    return df, types
+
+
+def test_profile_columns(benchmark, large_dataset):
+    benchmark.pedantic(profile_columns, args=large_dataset, rounds=ROUNDS)
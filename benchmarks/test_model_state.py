@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import clear_caches
+from modelbuilder.internals.model_state import ModelState, generate_code, update_model_state
+
+ROUNDS = 5
+
+UPDATES = {
+    'structural': {'mfl': 'ELIMINATION(MM);PERIPHERALS(1)', 'type': 'structural'},
+    'variability': {
+        'mfl': 'IIV([CL,VC,MAT],EXP);COVARIANCE(IIV,[CL,VC,MAT])',
+        'type': 'variability',
+    },
+    'covariate': {'mfl': 'COVARIATE(CL,WGT,exp)', 'type': 'covariate'},
+    'error': {'error': {1: 'comb'}},
+    'model_attrs': {'model_attrs': {'name': 'run1', 'description': 'benchmark'}},
+    'iov': {'iov': [{'occ': 'FA1', 'list_of_parameters': ['CL'], 'distribution': 'same-as-iiv'}]},
+}
+
+
+@pytest.fixture
+def model_state(pheno):
+    ms = ModelState.create('oral')
+    ms.generate_model(*pheno)
+    return ms
+
+
+@pytest.mark.parametrize('model_type', ['iv', 'oral'])
+def test_create(benchmark, model_type):
+    benchmark.pedantic(ModelState.create, args=(model_type,), setup=clear_caches, rounds=ROUNDS)
+
+
+@pytest.mark.parametrize('cached', [False, True], ids=['cold', 'cached'])
+def test_generate_model(benchmark, model_state, pheno, cached):
+    setup = None if cached else clear_caches
+    benchmark.pedantic(model_state.generate_model, args=pheno, setup=setup, rounds=ROUNDS)
+
+
+def test_list_functions(benchmark, model_state, pheno):
+    benchmark.pedantic(model_state.list_functions, args=pheno, setup=clear_caches, rounds=ROUNDS)
+
+
+def benchmark_update(benchmark, model_state, pheno, **kwargs):
+    # Updating only replaces attributes, the cost is in generating the updated model. The model of
+    # the state before the update is cached, as it is in the app.
+    def setup():
+        clear_caches()
+        model_state.generate_model(*pheno)
+
+    def update():
+        update_model_state(model_state, **kwargs).generate_model(*pheno)
+
+    benchmark.pedantic(update, setup=setup, rounds=ROUNDS)
+
+
+@pytest.mark.parametrize('feature', UPDATES)
+def test_update_model_state(benchmark, model_state, pheno, feature):
+    benchmark_update(benchmark, model_state, pheno, **UPDATES[feature])
+
+
+def test_update_model_state_parameters(benchmark, model_state, pheno):
+    parameters = model_state.parameters.to_dict()['parameters']
+    parameters = ({**parameters[0], 'init': parameters[0]['init'] * 2},) + tuple(parameters[1:])
+    benchmark_update(benchmark, model_state, pheno, parameters=parameters)
+
+
+@pytest.mark.parametrize('language', ['python', 'r'])
+def test_generate_code(benchmark, model_state, pheno, language):
+    funcs, _ = model_state.list_functions(*pheno)
+    benchmark(generate_code, funcs, language)
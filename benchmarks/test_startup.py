@@ -0,0 +1,11 @@
+import subprocess
+import sys
+
+
+def import_app():
+    # In a new process, modules that are already imported would not be timed otherwise
+    subprocess.run([sys.executable, '-c', 'import modelbuilder.app'], check=True)
+
+
+def test_import_app(benchmark):
+    benchmark.pedantic(import_app, rounds=5)
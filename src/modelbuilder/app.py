@@ -1,6 +1,7 @@
 import os
 import sys
 import webbrowser
+from functools import partial
 from threading import Timer
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
@@ -8,13 +9,19 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
 import dash_bootstrap_components as dbc
 from dash import Dash
 
+import modelbuilder.config as config
 import modelbuilder.design.main as df
 from modelbuilder.callbacks.covariates import covariate_callbacks
+from modelbuilder.callbacks.debounce import debounce_callbacks
+from modelbuilder.callbacks.diagnostics import diagnostics_callbacks
 from modelbuilder.callbacks.error_model import error_model_callbacks
-from modelbuilder.callbacks.general import general_callbacks
+from modelbuilder.callbacks.general import general_callbacks, handle_callback_error
+from modelbuilder.callbacks.history import history_callbacks
+from modelbuilder.callbacks.model_view import model_view_callbacks
 from modelbuilder.callbacks.parameter_variability import parameter_variability_callbacks
 from modelbuilder.callbacks.parameters import parameter_callbacks
 from modelbuilder.callbacks.structural import structural_callbacks
+from modelbuilder.routes import register_routes
 
 PHARMPY_LOGO = "https://pharmpy.github.io/latest/_images/Pharmpy_logo.svg"
 
@@ -24,16 +31,26 @@ app = Dash(
     external_stylesheets=[dbc.themes.FLATLY],
     suppress_callback_exceptions=True,
     update_title=None,
+    # Requires flask-compress, enabled by pharmpy-modelbuilder serve
+    compress=os.environ.get('MODELBUILDER_COMPRESS') == '1',
+    background_callback_manager=config.create_background_callback_manager(),
+    on_error=handle_callback_error,
 )
+server = app.server
 
-app.layout = df.layout
+app.layout = partial(df.serve_layout, debounce_window=config.debounce_window)
 
 general_callbacks(app)
+debounce_callbacks(app)
+model_view_callbacks(app)
 structural_callbacks(app)
 parameter_callbacks(app)
 error_model_callbacks(app)
 parameter_variability_callbacks(app)
 covariate_callbacks(app)
+diagnostics_callbacks(app)
+history_callbacks(app)
+register_routes(app)
 
 
 def open_browser():
@@ -42,6 +59,7 @@ def open_browser():
 
 def run():
     Timer(1, open_browser).start()
+    config.start_warm_up()
     app.run(debug=True, use_reloader=False)
 
 
@@ -0,0 +1,37 @@
+// Debouncing of edits in the data tables. Edits (data and selected rows) within the debounce
+// window are merged and written as one change to the "<table id>-edits" store, which is what the
+// server callbacks listen to. Changes that leave the table as it was when last written (e.g. when
+// a server callback writes back the same data) are dropped.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    modelbuilder: {
+        debounce_edits: function (data, selected_rows, window_ms) {
+            const context = window.dash_clientside.callback_context;
+            const table_id = context.inputs_list[0].id;
+            const state = window.dash_clientside.modelbuilder._edits[table_id] || {
+                timer: null,
+                triggered: new Set(),
+                last: null,
+            };
+            window.dash_clientside.modelbuilder._edits[table_id] = state;
+
+            context.triggered.forEach(function (trigger) {
+                state.triggered.add(trigger.prop_id.split('.').pop());
+            });
+
+            clearTimeout(state.timer);
+            state.timer = setTimeout(function () {
+                const current = JSON.stringify([data, selected_rows]);
+                const triggered = Array.from(state.triggered);
+                state.triggered.clear();
+                if (current === state.last) {
+                    return;
+                }
+                state.last = current;
+                window.dash_clientside.set_props(table_id + '-edits', {
+                    data: {triggered: triggered, time: Date.now()},
+                });
+            }, window_ms);
+        },
+        _edits: {},
+    },
+});
@@ -0,0 +1,54 @@
+// Upload of datasets. The selected file is sent as is to the upload endpoint of the server (see
+// routes.py) instead of as a base64 data URL through the callbacks. The id of the stored dataset is
+// then written to the "dataset-upload" store, which is what the server callbacks listen to.
+(function () {
+    const ENDPOINT = '_modelbuilder/datasets';
+
+    function setPath(value) {
+        window.dash_clientside.set_props('dataset-path', {value: value});
+    }
+
+    function upload(file) {
+        const request = new XMLHttpRequest();
+        request.open('POST', ENDPOINT + '?filename=' + encodeURIComponent(file.name));
+        request.upload.onprogress = function (event) {
+            if (event.lengthComputable) {
+                const percent = Math.round((100 * event.loaded) / event.total);
+                setPath('Uploading ' + file.name + ' (' + percent + '%)');
+            }
+        };
+        request.onload = function () {
+            if (request.status === 413) {
+                setPath('Dataset too large!');
+                return;
+            }
+            if (request.status !== 200) {
+                setPath('Dataset error!');
+                return;
+            }
+            const dataset = JSON.parse(request.responseText);
+            // The time makes uploads of the same file trigger the callbacks again
+            dataset.time = Date.now();
+            window.dash_clientside.set_props('dataset-upload', {data: dataset});
+        };
+        request.onerror = function () {
+            setPath('Dataset error!');
+        };
+        request.send(file);
+    }
+
+    // NOTE: The file dialog has to be opened in the click event of the user
+    document.addEventListener('click', function (event) {
+        if (!event.target.closest('#upload-dataset')) {
+            return;
+        }
+        const input = document.createElement('input');
+        input.type = 'file';
+        input.addEventListener('change', function () {
+            if (input.files.length > 0) {
+                upload(input.files[0]);
+            }
+        });
+        input.click();
+    });
+})();
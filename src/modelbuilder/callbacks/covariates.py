@@ -1,16 +1,19 @@
-import pandas as pd
 from dash import Input, Output, State
 from dash.exceptions import PreventUpdate
-from pharmpy.mfl import Covariate, ModelFeatures
+from pharmpy.internals.module.lazy import LazyImport
 
 import modelbuilder.config as config
 from modelbuilder.design.style_elements import (
     create_dropdown,
     create_options_dict,
 )
-from modelbuilder.internals.help_functions import render_model_code
+from modelbuilder.internals.column_profile import get_column_profiles, rank_covariates
+from modelbuilder.internals.help_functions import new_state_token
 from modelbuilder.internals.model_state import update_model_state
 
+pd = LazyImport('pd', globals(), 'pandas')
+pharmpy_mfl = LazyImport('pharmpy_mfl', globals(), 'pharmpy.mfl')
+
 
 def covariate_callbacks(app):
     @app.callback(
@@ -20,31 +23,37 @@ def covariate_callbacks(app):
         Output('error_message', 'children'),
         Input('all-tabs', 'value'),
         Input("dataset-path", 'value'),
+        Input("history-token", "data"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def initialize_cov(tab, path):
+    def initialize_cov(tab, path, history_token, session_id):
         if tab == "covariate-tab":
-            if config.model_state.dataset is None:
+            # NOTE: The individual parameters are those of the generated model
+            ms = config.session_store.get(session_id).sync_with_model()
+            if ms.dataset is None:
                 error_message = 'Please provide a dataset in order to add covariates'
             else:
                 error_message = ''
 
-            covariates = config.model_state.mfl.covariates
+            covariates = ms.mfl.covariates
 
-            parameter_names = config.model_state.individual_parameters
+            parameter_names = ms.individual_parameters
 
             options_parameter = [
                 create_options_dict({i: i for i in parameter_names}, clearable=False)
             ]
-            datainfo = config.model_state.generate_model().datainfo
-            cov_opts = []
-            if 'covariate' in datainfo.types:
-                cov_opts.extend(datainfo.typeix['covariate'].names)
-            if 'unknown' in datainfo.types:
-                cov_opts.extend(datainfo.typeix['unknown'].names)
-            options_covariate = [
-                create_options_dict({i: i for i in cov_opts if cov_opts}, clearable=False)
-            ]
+            cov_opts = {}
+            if ms.dataset is not None:
+                # Columns that are constant within ID (e.g. baseline covariates) first, then by
+                # correlation with the observations, labelled with a suggested effect
+                for p in rank_covariates(get_column_profiles(ms.dataset)):
+                    if p.constant_within_id:
+                        label = f'{p.name} ({p.suggested_effect})'
+                    else:
+                        label = f'{p.name} (time-varying, {p.suggested_effect})'
+                    cov_opts[label] = p.name
+            options_covariate = [create_options_dict(cov_opts, clearable=False)]
             options_effect = [
                 create_options_dict(
                     {
@@ -59,7 +68,7 @@ def covariate_callbacks(app):
                 )
             ]
             options_operation = [create_options_dict({'*': '*', '+': '+'}, clearable=False)]
-            if config.model_state.dataset is None:
+            if ms.dataset is None:
                 options_covariate = [create_options_dict({}, clearable=False)]
                 options = options_parameter + options_covariate + options_effect + options_operation
                 dropdown = create_dropdown(
@@ -101,24 +110,25 @@ def covariate_callbacks(app):
             raise PreventUpdate
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Output('error_message', 'children', allow_duplicate=True),
-        Input("cov_table", "data"),
-        Input("cov_table", "selected_rows"),
+        Input("cov_table-edits", "data"),
         Input('error_message', 'children'),
+        State("cov_table", "data"),
+        State("cov_table", "selected_rows"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def add_cov(data, selected_rows, error_msg):
+    def add_cov(edits, error_msg, data, selected_rows, session_id):
         error_message = error_msg
-        if selected_rows and config.model_state.dataset is not None:
+        ms_current = config.session_store.get(session_id)
+        if selected_rows and ms_current.dataset is not None:
             error_message = ''
 
             # Check that covariate is not used as an occasion column
             occ = []
-            if config.model_state.iov:
-                occ = [iov['occ'] for iov in config.model_state.iov]
+            if ms_current.iov:
+                occ = [iov['occ'] for iov in ms_current.iov]
 
             new_data = [data[row] for row in selected_rows if all(data[row].values())]
             # Make sure that covariate cannot be added to a parameter twice
@@ -145,20 +155,20 @@ def covariate_callbacks(app):
                 covariates = []
                 for d in new_data:
                     param, cov, fp, op = d['parameter'], d['covariate'], d['effect'], d['operation']
-                    cov = Covariate.create(
+                    cov = pharmpy_mfl.Covariate.create(
                         parameter=param, covariate=cov, fp=fp, op=op, optional=False
                     )
                     covariates.append(cov)
-                mfl_new = ModelFeatures.create(covariates)
-                ms = update_model_state(config.model_state, mfl=mfl_new, type='covariate')
+                mfl_new = pharmpy_mfl.ModelFeatures.create(covariates)
+                ms = update_model_state(ms_current, mfl=mfl_new, type='covariate')
             else:
-                ms = config.model_state
+                ms = ms_current
         else:
-            mfl_old = config.model_state.mfl
+            mfl_old = ms_current.mfl
             mfl_new = mfl_old - mfl_old.covariates
-            ms = update_model_state(config.model_state, mfl=mfl_new, type='covariate')
-        config.model_state = ms
-        return *render_model_code(ms), error_message
+            ms = update_model_state(ms_current, mfl=mfl_new, type='covariate')
+        config.session_store.commit(session_id, ms)
+        return new_state_token(), error_message
 
     @app.callback(
         Output("cov_table", "data", allow_duplicate=True),
@@ -1,9 +1,11 @@
-import pandas as pd
 from dash import Input, Output
 from dash.exceptions import PreventUpdate
+from pharmpy.internals.module.lazy import LazyImport
 
 import modelbuilder.config as config
 
+pd = LazyImport('pd', globals(), 'pandas')
+
 
 def datainfo_callbacks(app):
     @app.callback(Output("datatable", "data"), Input("all-tabs", "value"))
@@ -0,0 +1,20 @@
+from dash import ClientsideFunction, Input, State
+
+# Tables whose edits are debounced, the server callbacks listen to "<table id>-edits"
+DEBOUNCED_TABLES = ('iiv_table', 'iov_table', 'cov_table', 'parameter-table')
+
+
+def debounce_callbacks(app):
+    # NOTE: These callbacks have no outputs, the edits store is set from assets/debounce.js when
+    # the debounce window has passed. Declaring it as an output would make the graph circular for
+    # callbacks that write to their table.
+    for table_id in DEBOUNCED_TABLES:
+        app.clientside_callback(
+            ClientsideFunction(namespace='modelbuilder', function_name='debounce_edits'),
+            Input(table_id, 'data'),
+            Input(table_id, 'selected_rows'),
+            State('debounce-window', 'data'),
+            prevent_initial_call=True,
+        )
+
+    return
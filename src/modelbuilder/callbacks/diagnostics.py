@@ -0,0 +1,33 @@
+from dash import Input, Output, ctx, dcc
+from dash.exceptions import PreventUpdate
+
+from modelbuilder.internals.profiling import profiler
+
+
+def diagnostics_callbacks(app):
+    @app.callback(
+        Output("diagnostics-table", "data"),
+        Input("diagnostics-refresh-btn", "n_clicks"),
+        prevent_initial_call=True,
+    )
+    def refresh_diagnostics(n_clicks):
+        rows = profiler.stats()
+        for row in rows:
+            for key in ['total', 'mean', 'max']:
+                row[key] = round(row[key] * 1000, 2)
+        return rows
+
+    @app.callback(
+        Output("diagnostics-download", "data"),
+        Input("diagnostics-json-btn", "n_clicks"),
+        Input("diagnostics-trace-btn", "n_clicks"),
+        prevent_initial_call=True,
+    )
+    def download_diagnostics(n_clicks_json, n_clicks_trace):
+        if ctx.triggered_id == 'diagnostics-json-btn' and n_clicks_json:
+            return dcc.send_string(profiler.to_json(), 'modelbuilder_profile.json')
+        elif ctx.triggered_id == 'diagnostics-trace-btn' and n_clicks_trace:
+            return dcc.send_string(profiler.to_chrome_trace(), 'modelbuilder_trace.json')
+        raise PreventUpdate
+
+    return
@@ -3,39 +3,38 @@ from dash.exceptions import PreventUpdate
 
 import modelbuilder.config as config
 from modelbuilder.design.style_elements import disable_component, enable_component
-from modelbuilder.internals.help_functions import render_model_code
+from modelbuilder.internals.help_functions import new_state_token
 from modelbuilder.internals.model_state import update_model_state
 
 
 def error_model_callbacks(app):
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Output("additional-types-checklist", "value"),
         Input("base-type-radio", "value"),
         State("base-type-radio-dv2", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_base_error_model(base_error, base_error2):
+    def update_base_error_model(base_error, base_error2, session_id):
         if base_error:
             if base_error2 is None:
                 base_error2 = ''
-            ms = update_model_state(config.model_state, error={1: base_error, 2: base_error2})
-            if ms != config.model_state:
-                config.model_state = ms
-                return *render_model_code(ms), []
+            ms_current = config.session_store.get(session_id)
+            ms = update_model_state(ms_current, error={1: base_error, 2: base_error2})
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token(), []
         raise PreventUpdate
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("additional-types-checklist", "value"),
         State("additional-types-checklist-dv2", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_additional_error_model(additional_type, additional_type_2):
+    def update_additional_error_model(additional_type, additional_type_2, session_id):
         # FIXME: when power is added after iiv on ruv then the resulting error model will be wrong
         # Issue https://github.com/pharmpy/pharmpy/issues/3102
         if additional_type is not None:
@@ -44,29 +43,28 @@ def error_model_callbacks(app):
                 additional_types_2 = ';'.join(additional_type_2)
             else:
                 additional_types_2 = ''
-            ms = update_model_state(
-                config.model_state, error={1: additional_types, 2: additional_types_2}
-            )
-            if ms != config.model_state:
-                config.model_state = ms
-                return render_model_code(ms)
+            ms_current = config.session_store.get(session_id)
+            ms = update_model_state(ms_current, error={1: additional_types, 2: additional_types_2})
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token()
         raise PreventUpdate
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Output("additional-types-checklist-dv2", "value"),
         Input("base-type-radio-dv2", "value"),
         State("base-type-radio", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_base_error_model_dv2(base_error, base_error1):
+    def update_base_error_model_dv2(base_error, base_error1, session_id):
         if base_error:
-            ms = update_model_state(config.model_state, error={1: base_error1, 2: base_error})
-            if ms != config.model_state:
-                config.model_state = ms
-                return *render_model_code(ms), []
+            ms_current = config.session_store.get(session_id)
+            ms = update_model_state(ms_current, error={1: base_error1, 2: base_error})
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token(), []
         raise PreventUpdate
 
     @app.callback(
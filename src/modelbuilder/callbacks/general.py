@@ -1,22 +1,27 @@
-import base64
-import io
-
-import pandas as pd
-from dash import Input, Output, State
+from dash import Input, Output, State, dcc, no_update, set_props
 from dash.exceptions import PreventUpdate
-from pharmpy.modeling import write_model
 
 import modelbuilder.config as config
-from modelbuilder.internals.help_functions import render_model_code
+from modelbuilder.internals.column_profile import get_column_profiles
+from modelbuilder.internals.dataset import DatasetExpiredError, DatasetHandle
+from modelbuilder.internals.export import export_queue
+from modelbuilder.internals.help_functions import new_state_token
 from modelbuilder.internals.model_state import ModelState, update_model_state
 
 
+def handle_callback_error(err):
+    # Error handler of all callbacks (on_error of the app). A dataset that has been pruned from the
+    # dataset store is reported in the dataset field, other errors are raised as usual.
+    if isinstance(err, DatasetExpiredError):
+        set_props("dataset-path", {'value': str(err)})
+        return None
+    raise err
+
+
 def general_callbacks(app):
     # Create model
     @app.callback(
-        Output("output-model", "value"),
-        Output("output-python", "value"),
-        Output("output-r", "value"),
+        Output("model-state-token", "data"),
         Output("abs_rate-radio", "value"),
         Output("elim_radio", "value"),
         Output("peripheral-radio", "value"),
@@ -25,8 +30,9 @@ def general_callbacks(app):
         State("model-name", "value"),
         State("model-description", "value"),
         State("modelformat", "value"),
+        State("session-id", "data"),
     )
-    def change_route(route, model_name, model_description, model_format):
+    def change_route(route, model_name, model_description, model_format, session_id):
         # Dataset is connected to model in parse_dataset
         # old_dataset = config.model.dataset
         # old_datainfo = config.model.datainfo
@@ -46,9 +52,10 @@ def general_callbacks(app):
             ms = update_model_state(
                 ms, model_attrs={'name': model_name, 'description': model_description}
             )
-        config.model_state = ms
+        # NOTE: A new route or model type is not undone, the other controls were reset with it
+        config.session_store.reset(session_id, ms)
         return (
-            *render_model_code(ms),
+            new_state_token(),
             default_abs_rate,
             default_elim,
             default_peripherals,
@@ -56,9 +63,7 @@ def general_callbacks(app):
         )
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Output('pd_effect_radio', 'value'),
         Output("pd_expression_radio", "value"),
         Output("abs_rate-radio", "value", allow_duplicate=True),
@@ -70,9 +75,12 @@ def general_callbacks(app):
         State("model-name", "value"),
         State("model-description", "value"),
         State("modelformat", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def change_model_type(model_type, route, model_name, model_description, model_format):
+    def change_model_type(
+        model_type, route, model_name, model_description, model_format, session_id
+    ):
         effect = None
         expr = None
 
@@ -92,18 +100,18 @@ def general_callbacks(app):
             ms = update_model_state(
                 ms, model_attrs={'name': model_name, 'description': model_description}
             )
-        config.model_state = ms
+        ms_base = ms
 
         if model_type == 'PD':
             mfl = 'DIRECTEFFECT(LINEAR)'
             ms = ms.replace(mfl=mfl)
-            ms = update_model_state(config.model_state, mfl)
+            ms = update_model_state(ms_base, mfl)
             effect = 'DIRECTEFFECT'
             expr = 'LINEAR'
-            config.model_state = ms
+        config.session_store.reset(session_id, ms)
 
         return (
-            *render_model_code(ms),
+            new_state_token(),
             effect,
             expr,
             default_abs_rate,
@@ -114,7 +122,7 @@ def general_callbacks(app):
 
     @app.callback(
         Output("dataset-path", 'value', allow_duplicate=True),
-        Output('upload-dataset', 'contents'),
+        Output('dataset-upload', 'data'),
         Input("model_type", "value"),
         Input("route-radio", "value"),
         prevent_initial_call=True,
@@ -123,89 +131,145 @@ def general_callbacks(app):
         return "", None
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("model-name", "value"),
         Input("model-description", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def change_name_desc(name, description):
-        model_attrs = config.model_state.model_attrs.copy()
+    def change_name_desc(name, description, session_id):
+        ms_current = config.session_store.get(session_id)
+        model_attrs = ms_current.model_attrs.copy()
         if name or description:
             if name:
                 model_attrs['name'] = name
             if description:
                 model_attrs['description'] = description
-            ms = update_model_state(config.model_state, model_attrs=model_attrs)
-            if ms != config.model_state:
-                config.model_state = ms
-                return render_model_code(ms)
+            ms = update_model_state(ms_current, model_attrs=model_attrs)
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token()
         raise PreventUpdate
 
     # Callback for changing the model print
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("modelformat", 'value'),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def change_format(format):
+    def change_format(format, session_id):
         if format:
-            ms = config.model_state.replace(model_format=format)
-            config.model_state = ms
-            return render_model_code(ms)
+            ms = config.session_store.get(session_id).replace(model_format=format)
+            config.session_store.commit(session_id, ms)
+            return new_state_token()
         raise PreventUpdate
 
-    # Dataset-parsing
-    @app.callback(
-        Output("dataset-path", 'value'),
-        Input("upload-dataset", 'contents'),
-        State('upload-dataset', 'filename'),
-    )
-    def parse_dataset(contents, filename):
-        if contents is not None:
-            content_type, content_string = contents.split(',')
-            decoded = base64.b64decode(content_string)
+    # Dataset-parsing, the dataset has been uploaded to the dataset store by assets/upload.js
+    def load_dataset(upload, session_id, progress=None):
+        if upload is not None:
+            ms = config.session_store.get(session_id)
+            dataset = DatasetHandle(upload['id'], upload['filename'])
             try:
-                data = pd.read_table(
-                    io.StringIO(decoded.decode('utf-8')), sep=r'\s+|,', engine='python'
-                )
+                data = dataset.load(progress=progress)
+                # Profiled now rather than when the covariate or IOV tabs are opened
+                get_column_profiles(dataset)
             except:  # noqa E722
                 error = "Dataset error!"
-                config.model_state.dataset = None
+                config.session_store.commit(session_id, ms.replace(dataset=None))
                 return error
             else:
-                config.model_state.dataset = data
-                config.model_state.col = list(data.columns)
-                return (str(filename),)
+                ms = ms.replace(dataset=dataset, col=list(data.columns))
+                config.session_store.commit(session_id, ms)
+                return str(dataset.name)
         else:
             raise PreventUpdate
 
-    # Callback for download-btn
+    dataset_callback_args = (
+        Output("dataset-path", 'value'),
+        Input("dataset-upload", 'data'),
+        State("session-id", "data"),
+    )
+    if config.background_callbacks:
+        # The progress of large datasets is shown in the dataset path field
+        @app.callback(
+            *dataset_callback_args, background=True, progress=Output("dataset-path", 'value')
+        )
+        def parse_dataset_with_progress(set_progress, upload, session_id):
+            def progress(fraction):
+                set_progress(f"Loading {upload['filename']} ({fraction:.0%})")
+
+            return load_dataset(upload, session_id, progress)
+
+    else:
+
+        @app.callback(*dataset_callback_args)
+        def parse_dataset(upload, session_id):
+            return load_dataset(upload, session_id)
+
+    # Callback for download-btn, the model and dataset are exported in the background
     @app.callback(
         Output("model_confirm", "children"),
+        Output("export-job", "data"),
+        Output("export-interval", "disabled"),
         Input("download-btn", "n_clicks"),
         State("model-name", "value"),
         State("model_path", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def make_mod(n_clicks, name, path):
+    def make_mod(n_clicks, name, path, session_id):
         if not name:
-            return "please provide model name"
+            return "please provide model name", None, True
         if name and n_clicks:
-            if n_clicks:
-                model = config.model_state.generate_model()
-                if model.dataset is None:
-                    return "Please provide a dataset"
-                else:
-                    if path:
-                        write_model(config.model_state.generate_model(), path=path)
-                        return f"Model written to {path}"
-                    else:
-                        write_model(config.model_state.generate_model())
-                        return 'Model written to directory folder'
-        return f'Provided path {path} '
+            ms = config.session_store.get(session_id)
+            if ms.dataset is None:
+                return "Please provide a dataset", None, True
+            job_id, _ = export_queue.submit(ms, target=path or None)
+            return export_queue.status(job_id)['message'], job_id, False
+        return f'Provided path {path} ', None, True
+
+    # Callback for batch-btn, the variants are exported like a saved model
+    @app.callback(
+        Output("model_confirm", "children", allow_duplicate=True),
+        Output("export-job", "data", allow_duplicate=True),
+        Output("export-interval", "disabled", allow_duplicate=True),
+        Input("batch-btn", "n_clicks"),
+        State("batch-grid", "value"),
+        State("batch-formats", "value"),
+        State("session-id", "data"),
+        prevent_initial_call=True,
+    )
+    def export_variants(n_clicks, grid, model_formats, session_id):
+        if not n_clicks:
+            raise PreventUpdate
+        if not grid:
+            return "Please provide a grid, e.g. PERIPHERALS(0..2);ERROR(add,prop)", None, True
+        if not model_formats:
+            return "Please select at least one model format", None, True
+        ms = config.session_store.get(session_id)
+        try:
+            job_id, _ = export_queue.submit_batch(ms, grid, model_formats)
+        except ValueError as e:
+            return str(e), None, True
+        return export_queue.status(job_id)['message'], job_id, False
+
+    @app.callback(
+        Output("model_confirm", "children", allow_duplicate=True),
+        Output("export-interval", "disabled", allow_duplicate=True),
+        Output("model-download", "data"),
+        Input("export-interval", "n_intervals"),
+        State("export-job", "data"),
+        prevent_initial_call=True,
+    )
+    def poll_export(n_intervals, job_id):
+        if not job_id:
+            return no_update, True, no_update
+        status = export_queue.status(job_id)
+        if status is None:
+            return "Export not found", True, no_update
+        if status['state'] == 'done':
+            return status['message'], True, dcc.send_file(export_queue.archive_path(job_id))
+        return status['message'], status['state'] == 'failed', no_update
 
     return
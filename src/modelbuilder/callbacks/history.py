@@ -0,0 +1,72 @@
+from dash import Input, Output, State, ctx, no_update
+from dash.exceptions import PreventUpdate
+
+import modelbuilder.config as config
+from modelbuilder.internals.help_functions import (
+    get_error_values,
+    get_structural_values,
+    get_transits,
+    new_state_token,
+)
+
+
+def history_callbacks(app):
+    @app.callback(
+        Output("model-state-token", "data", allow_duplicate=True),
+        Output("history-token", "data"),
+        Output("abs_rate-radio", "value", allow_duplicate=True),
+        Output("elim_radio", "value", allow_duplicate=True),
+        Output("peripheral-radio", "value", allow_duplicate=True),
+        Output("abs_delay_radio", "value", allow_duplicate=True),
+        Output("transits_no", "value", allow_duplicate=True),
+        Output("depot_checklist", "value", allow_duplicate=True),
+        Output("base-type-radio", "value", allow_duplicate=True),
+        Output("additional-types-checklist", "value", allow_duplicate=True),
+        Output("base-type-radio-dv2", "value", allow_duplicate=True),
+        Output("additional-types-checklist-dv2", "value", allow_duplicate=True),
+        Output("modelformat", "value", allow_duplicate=True),
+        Output("model-name", "value", allow_duplicate=True),
+        Output("model-description", "value", allow_duplicate=True),
+        Input("undo-btn", "n_clicks"),
+        Input("redo-btn", "n_clicks"),
+        State("session-id", "data"),
+        prevent_initial_call=True,
+    )
+    def step_history(n_clicks_undo, n_clicks_redo, session_id):
+        # NOTE: The earlier model states are usually still in the caches (by fingerprint), so
+        # their code is not generated again
+        if ctx.triggered_id == 'undo-btn':
+            ms = config.session_store.undo(session_id)
+        else:
+            ms = config.session_store.redo(session_id)
+        if ms is None:
+            raise PreventUpdate
+        # NOTE: The controls are set to the restored state, their callbacks then give the same
+        # state and do not commit. The tables are rendered again on the history token.
+        transits = get_transits(ms)
+        if transits is None:
+            transits_values = (no_update, no_update)
+        else:
+            number, depot = transits
+            transits_values = (number, ['depot'] if depot else [])
+        return (
+            new_state_token(),
+            new_state_token(),
+            *get_structural_values(ms),
+            *transits_values,
+            *get_error_values(ms, 1),
+            *get_error_values(ms, 2),
+            ms.model_format,
+            ms.model_attrs.get('name'),
+            ms.model_attrs.get('description'),
+        )
+
+    @app.callback(
+        Output("undo-btn", "disabled"),
+        Output("redo-btn", "disabled"),
+        Input("model-state-token", "data"),
+        State("session-id", "data"),
+    )
+    def update_history_buttons(token, session_id):
+        history = config.session_store.history(session_id)
+        return not history.can_undo, not history.can_redo
@@ -0,0 +1,50 @@
+from dash import Input, Output, State, no_update
+from dash.exceptions import PreventUpdate
+
+import modelbuilder.config as config
+from modelbuilder.internals.help_functions import CODE_VIEWS, render_model_view
+
+
+def model_view_callbacks(app):
+    background_kwargs = {}
+    token_input = Input("model-state-token", "data")
+    if config.background_callbacks:
+        # NOTE: Dash terminates a running job when the callback is triggered again, so a
+        # rendering of a state that has been superseded is cancelled
+        background_kwargs = {
+            'background': True,
+            'running': [(Output("model-view-tabs", "style"), {'opacity': 0.5}, {'opacity': 1.0})],
+        }
+        token_input = Input("model-view-token", "data")
+
+        # A job is a forked process, whose caches are lost when it ends. The model is therefore
+        # generated here, where the cached pipeline stages of the earlier states are, and the job
+        # (a fork of this process) only renders it. The rendered code is kept in the model cache.
+        @app.callback(
+            Output("model-view-token", "data"),
+            Input("model-state-token", "data"),
+            State("session-id", "data"),
+        )
+        def generate_model_view(token, session_id):
+            if token is None:
+                raise PreventUpdate
+            config.session_store.get(session_id).list_functions()
+            return token
+
+    # Only the selected view is rendered, the other views are rendered when their tab is opened
+    @app.callback(
+        Output("output-model", "value"),
+        Output("output-python", "value"),
+        Output("output-r", "value"),
+        token_input,
+        Input("model-view-tabs", "value"),
+        State("session-id", "data"),
+        **background_kwargs,
+    )
+    def render_selected_view(token, view, session_id):
+        if token is None or view not in CODE_VIEWS:
+            raise PreventUpdate
+        code = render_model_view(config.session_store.get(session_id), view)
+        return tuple(code if v == view else no_update for v in CODE_VIEWS)
+
+    return
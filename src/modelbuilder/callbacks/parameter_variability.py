@@ -1,10 +1,9 @@
 import ast
 import itertools
 
-import pandas as pd
-from dash import Input, Output, State, ctx
+from dash import Input, Output, State
 from dash.exceptions import PreventUpdate
-from pharmpy.mfl import IIV, Covariance
+from pharmpy.internals.module.lazy import LazyImport
 
 import modelbuilder.config as config
 from modelbuilder.design.style_elements import (
@@ -12,9 +11,13 @@ from modelbuilder.design.style_elements import (
     create_dropdown,
     create_options_dict,
 )
-from modelbuilder.internals.help_functions import render_model_code
+from modelbuilder.internals.column_profile import get_column_profiles
+from modelbuilder.internals.help_functions import new_state_token
 from modelbuilder.internals.model_state import update_model_state
 
+pd = LazyImport('pd', globals(), 'pandas')
+pharmpy_mfl = LazyImport('pharmpy_mfl', globals(), 'pharmpy.mfl')
+
 
 def parameter_variability_callbacks(app):
     @app.callback(
@@ -23,13 +26,17 @@ def parameter_variability_callbacks(app):
         Output("iiv_table", "columns"),
         Output("iiv_table", "dropdown"),
         Input('all-tabs', 'value'),
+        Input("history-token", "data"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def render_iiv(tab):
+    def render_iiv(tab, history_token, session_id):
         if tab == "par-var-tab":
-            iivs = config.model_state.mfl.iiv
+            # NOTE: The individual parameters are those of the generated model
+            ms = config.session_store.get(session_id).sync_with_model()
+            iivs = ms.mfl.iiv
             parameters_with_iiv = {iiv.parameter: iiv.fp.lower() for iiv in iivs}
-            parameter_names = config.model_state.individual_parameters
+            parameter_names = ms.individual_parameters
             if iivs:
                 expr = []
                 for param in parameter_names:
@@ -72,7 +79,7 @@ def parameter_variability_callbacks(app):
             df = pd.DataFrame(table_dict)
             iiv_data = df.to_dict('records')
 
-            block = config.model_state.mfl.covariance
+            block = ms.mfl.covariance
             if block:
                 for i, block in enumerate(block):
                     parameters = block.parameters
@@ -97,19 +104,23 @@ def parameter_variability_callbacks(app):
         Output("iov_table", "selected_rows", allow_duplicate=True),
         Input('all-tabs', 'value'),
         Input("dataset-path", 'value'),
+        Input("history-token", "data"),
         State("iov_params_checklist", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def render_iov(tab, data, filename):
+    def render_iov(tab, data, history_token, filename, session_id):
         if tab == "par-var-tab":
-            parameter_names = [rv['list_of_parameters'] for rv in config.model_state.iov]
-            iov_checkboxes_options = config.model_state.individual_parameters
+            # NOTE: The individual parameters are those of the generated model
+            ms = config.session_store.get(session_id).sync_with_model()
+            parameter_names = [rv['list_of_parameters'] for rv in ms.iov]
+            iov_checkboxes_options = ms.individual_parameters
             iov_checkboxes_options = [
                 {'label': value, 'value': value, "disabled": True}
                 for value in iov_checkboxes_options
             ]
 
-            if config.model_state.dataset is None:
+            if ms.dataset is None:
                 iov_data = pd.DataFrame(
                     {
                         'list_of_parameters': [],
@@ -127,12 +138,17 @@ def parameter_variability_callbacks(app):
                     new_iov_checklist.append(d)
                 iov_checkboxes_options = new_iov_checklist
 
-                occ_opts = config.model_state.col
+                # Columns that vary within ID with few values (likely occasions) first
+                profiles = get_column_profiles(ms.dataset)
+                occ_opts = {}
+                for col in sorted(ms.col, key=lambda col: not profiles[col].is_occasion):
+                    label = f'{col} (occasion)' if profiles[col].is_occasion else col
+                    occ_opts[label] = col
                 outtext = ''
                 dropdown_opts = create_dropdown(
                     ['occ', 'distribution'],
                     [
-                        create_options_dict({i: i for i in occ_opts if occ_opts}, clearable=False),
+                        create_options_dict(occ_opts, clearable=False),
                         create_options_dict(
                             {
                                 'disjoint': 'disjoint',
@@ -154,12 +170,9 @@ def parameter_variability_callbacks(app):
 
             iov_data = iov_data.to_dict('records')
 
-            if config.model_state.iov:
-                iov_data = config.model_state.iov
+            if ms.iov:
                 # Lists must be converted to strings again
-                for dicts in iov_data:
-                    for keys in dicts:
-                        dicts[keys] = str(dicts[keys])
+                iov_data = [{key: str(value) for key, value in rv.items()} for rv in ms.iov]
                 selected_rows = list(range(len(iov_data)))
             else:
                 selected_rows = []
@@ -168,21 +181,21 @@ def parameter_variability_callbacks(app):
             raise PreventUpdate
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Output("iiv_table", "data", allow_duplicate=True),
         Output("iov_table", "selected_rows"),
-        Input("iiv_table", "data"),
-        Input("iiv_table", "selected_rows"),
-        Input("iov_table", "selected_rows"),
+        Input("iiv_table-edits", "data"),
+        State("iiv_table", "data"),
+        State("iiv_table", "selected_rows"),
+        State("iov_table", "selected_rows"),
         State("iov_table", "data"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def set_iivs(data, selected_rows, iov_selected_rows, iov_data):
+    def set_iivs(edits, data, selected_rows, iov_selected_rows, iov_data, session_id):
+        # NOTE: Edits within the debounce window are merged, see assets/debounce.js
         selected_rows_changed = (
-            'iiv_table.selected_rows' in ctx.triggered_prop_ids.keys()
-            and 'iiv_table.data' not in ctx.triggered_prop_ids.keys()
+            'selected_rows' in edits['triggered'] and 'data' not in edits['triggered']
         )
         features = []
         if selected_rows:
@@ -206,7 +219,7 @@ def parameter_variability_callbacks(app):
             for row in selected_rows:
                 parameter = data[row]['list_of_parameters']
                 expression = data[row]['expression']
-                iiv = IIV.create(parameter, fp=expression, optional=False)
+                iiv = pharmpy_mfl.IIV.create(parameter, fp=expression, optional=False)
                 features.append(iiv)
 
         else:
@@ -223,15 +236,16 @@ def parameter_variability_callbacks(app):
                         current_block.append(param)
                 if len(current_block) > 1:
                     blocks_new = [
-                        Covariance.create(type='IIV', parameters=block)
+                        pharmpy_mfl.Covariance.create(type='IIV', parameters=block)
                         for block in itertools.combinations(current_block, 2)
                     ]
                     features.extend(blocks_new)
 
-        ms = update_model_state(config.model_state, mfl=features, iov=iov, type='variability')
+        ms_current = config.session_store.get(session_id)
+        ms = update_model_state(ms_current, mfl=features, iov=iov, type='variability')
 
-        config.model_state = ms
-        return *render_model_code(ms), data, iov_selected_rows
+        config.session_store.commit(session_id, ms)
+        return new_state_token(), data, iov_selected_rows
 
     @app.callback(
         Output("iov_table", "data", allow_duplicate=True),
@@ -257,9 +271,11 @@ def parameter_variability_callbacks(app):
         Input("iiv_table", "selected_rows"),
         State("iov_params_checklist", "options"),
         State("iiv_table", "data"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_checklist(rows, iiv_selected_rows, options, iiv_data):
+    def update_checklist(rows, iiv_selected_rows, options, iiv_data, session_id):
+        ms = config.session_store.get(session_id)
         iiv_params = [iiv_data[row]['list_of_parameters'] for row in iiv_selected_rows]
         iov_params = []
         for row in rows:
@@ -273,7 +289,7 @@ def parameter_variability_callbacks(app):
         for opt in options:
             if (
                 opt['label'] in iiv_params
-                and config.model_state.dataset is not None
+                and ms.dataset is not None
                 and not opt['label'] in iov_params
             ):
                 opt['disabled'] = False
@@ -284,24 +300,25 @@ def parameter_variability_callbacks(app):
         return new_options
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Output('dataset_text', 'children', allow_duplicate=True),
-        Input("iov_table", "data"),
-        Input("iov_table", "selected_rows"),
+        Input("iov_table-edits", "data"),
+        State("iov_table", "data"),
+        State("iov_table", "selected_rows"),
         State('dataset_text', 'children'),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def set_iov(data, selected_rows, outtext):
+    def set_iov(edits, data, selected_rows, outtext, session_id):
         outtext = outtext
-        iivs = config.model_state.mfl.iiv
+        ms_current = config.session_store.get(session_id)
+        iivs = ms_current.mfl.iiv
         iiv_params = [iiv.parameter for iiv in iivs]
         if selected_rows:
             new_data = []
             covariates = []
-            if config.model_state.mfl.covariates:
-                covariates = [cov.covariate for cov in config.model_state.mfl.covariates]
+            if ms_current.mfl.covariates:
+                covariates = [cov.covariate for cov in ms_current.mfl.covariates]
             for row in selected_rows:
                 param = data[row]['list_of_parameters']
                 if isinstance(param, str):
@@ -314,9 +331,9 @@ def parameter_variability_callbacks(app):
                     outtext = ''
                     new_data.append(data[row])
             iov = new_data
-            ms = update_model_state(config.model_state, iov=iov)
+            ms = update_model_state(ms_current, iov=iov)
         else:
             iov = {}
-            ms = update_model_state(config.model_state, iov=iov)
-        config.model_state = ms
-        return *render_model_code(ms), outtext
+            ms = update_model_state(ms_current, iov=iov)
+        config.session_store.commit(session_id, ms)
+        return new_state_token(), outtext
@@ -1,11 +1,13 @@
-from dash import Input, Output
+from dash import Input, Output, State
 from dash.exceptions import PreventUpdate
-from pharmpy.model import JointNormalDistribution
+from pharmpy.internals.module.lazy import LazyImport
 
 import modelbuilder.config as config
-from modelbuilder.internals.help_functions import render_model_code
+from modelbuilder.internals.help_functions import new_state_token
 from modelbuilder.internals.model_state import update_model_state
 
+pharmpy_model = LazyImport('pharmpy_model', globals(), 'pharmpy.model')
+
 
 def check_all_same(p):  # p = model_parameters_to_dict["parameters"])
     if p:
@@ -27,11 +29,15 @@ def replace_empty(data):
     return data
 
 
-def fix_blocks(data):
-    old_params = config.model_state.parameters
-    model = config.model_state.generate_model()
+def fix_blocks(data, ms):
+    # NOTE: The parameters are those of the generated model
+    ms = ms.sync_with_model()
+    model = ms.generate_model()
+    old_params = ms.parameters
     rvs = model.random_variables
-    blocks = [rv.parameter_names for rv in rvs if isinstance(rv, JointNormalDistribution)]
+    blocks = [
+        rv.parameter_names for rv in rvs if isinstance(rv, pharmpy_model.JointNormalDistribution)
+    ]
 
     for block in blocks:
         old_fix = old_params[block[0]].fix
@@ -50,30 +56,34 @@ def parameter_callbacks(app):
     @app.callback(
         Output("parameter-table", "data"),
         Input('all-tabs', 'value'),
+        Input("history-token", "data"),
+        State("session-id", "data"),
     )
-    def create_table(tab):
+    def create_table(tab, history_token, session_id):
         if tab == 'parameters-tab':
-            return config.model_state.parameters.to_dict()['parameters']
+            ms = config.session_store.get(session_id).sync_with_model()
+            return ms.parameters.to_dict()['parameters']
         else:
             raise PreventUpdate
 
     @app.callback(
         Output("parameter-table", "data", allow_duplicate=True),
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
-        Input("parameter-table", "data"),
+        Output("model-state-token", "data", allow_duplicate=True),
+        Input("parameter-table-edits", "data"),
         Input('all-tabs', 'value'),
+        State("parameter-table", "data"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_table(data, tab):
+    def update_table(edits, tab, data, session_id):
         if tab == 'parameters-tab':
             data = replace_empty(data)
 
-            data = fix_blocks(data)
-            ms = update_model_state(config.model_state, parameters=data)
-            config.model_state = ms
+            ms_current = config.session_store.get(session_id)
+            data = fix_blocks(data, ms_current)
+            ms = update_model_state(ms_current, parameters=data)
+            config.session_store.commit(session_id, ms)
 
-            return data, *render_model_code(ms)
+            return data, new_state_token()
         else:
             raise PreventUpdate
@@ -3,7 +3,7 @@ from dash.exceptions import PreventUpdate
 
 import modelbuilder.config as config
 from modelbuilder.design.style_elements import disable_component, enable_component
-from modelbuilder.internals.help_functions import render_model_code
+from modelbuilder.internals.help_functions import get_transits, new_state_token
 from modelbuilder.internals.model_state import (
     update_model_state,
 )
@@ -11,19 +11,19 @@ from modelbuilder.internals.model_state import (
 
 def structural_callbacks(app):
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("abs_rate-radio", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_abs_rate_on_click(abs_rate):
+    def update_abs_rate_on_click(abs_rate, session_id):
         if abs_rate:
             mfl = f'ABSORPTION({abs_rate})'
-            ms = update_model_state(config.model_state, mfl, type='structural')
-            if ms != config.model_state:
-                config.model_state = ms
-                return render_model_code(ms)
+            ms_current = config.session_store.get(session_id)
+            ms = update_model_state(ms_current, mfl, type='structural')
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token()
         raise PreventUpdate
 
     @app.callback(
@@ -42,31 +42,30 @@ def structural_callbacks(app):
         return options_new, style_new
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("elim_radio", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_elim_on_click(elim):
+    def update_elim_on_click(elim, session_id):
         if elim:
             mfl = f'ELIMINATION({elim})'
-            ms = update_model_state(config.model_state, mfl, type='structural')
-            if ms != config.model_state:
-                config.model_state = ms
-                return render_model_code(ms)
+            ms_current = config.session_store.get(session_id)
+            ms = update_model_state(ms_current, mfl, type='structural')
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token()
         raise PreventUpdate
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("abs_delay_radio", "value"),
         Input("transits_no", "value"),
         Input("depot_checklist", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_abs_delay_on_click(abs_delay, no_transits, depot):
+    def update_abs_delay_on_click(abs_delay, no_transits, depot, session_id):
         if abs_delay:
             if abs_delay == 'transits':
                 if no_transits is not None and isinstance(no_transits, int):
@@ -78,10 +77,11 @@ def structural_callbacks(app):
                     mfl = 'LAGTIME(OFF);TRANSITS(0)'
             else:
                 mfl = abs_delay
-            ms = update_model_state(config.model_state, mfl, type='structural')
-            if ms != config.model_state:
-                config.model_state = ms
-                return render_model_code(ms)
+            ms_current = config.session_store.get(session_id)
+            ms = update_model_state(ms_current, mfl, type='structural')
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token()
         raise PreventUpdate
 
     @app.callback(
@@ -101,42 +101,42 @@ def structural_callbacks(app):
 
     # callback for peripheral compartments
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("peripheral-radio", "value"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def peripheral_compartments(n):
+    def peripheral_compartments(n, session_id):
         if n is not None:
             mfl = f'PERIPHERALS({n})'
-            ms = update_model_state(config.model_state, mfl, type='structural')
-            if ms != config.model_state:
-                config.model_state = ms
-                return render_model_code(ms)
+            ms_current = config.session_store.get(session_id)
+            ms = update_model_state(ms_current, mfl, type='structural')
+            if ms != ms_current:
+                config.session_store.commit(session_id, ms)
+                return new_state_token()
         raise PreventUpdate
 
     @app.callback(
-        Output("output-model", "value", allow_duplicate=True),
-        Output("output-python", "value", allow_duplicate=True),
-        Output("output-r", "value", allow_duplicate=True),
+        Output("model-state-token", "data", allow_duplicate=True),
         Input("pd_expression_radio", "value"),
         Input('pd_effect_radio', 'value'),
         Input('pd_production_radio', 'value'),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def update_pd(expr, effect, prod):
+    def update_pd(expr, effect, prod, session_id):
         if effect and expr:
             # FIXME: Workaround to reset to PK model
-            mfl_pk = config.model_state.mfl.filter('pk')
-            ms_pk = config.model_state.replace(mfl=mfl_pk)
+            ms_current = config.session_store.get(session_id)
+            mfl_pk = ms_current.mfl.filter('pk')
+            ms_pk = ms_current.replace(mfl=mfl_pk)
             if effect == 'INDIRECTEFFECT' and prod:
                 mfl = f'{effect}({expr},{prod})'
             else:
                 mfl = f'{effect}({expr})'
             ms = update_model_state(ms_pk, mfl, type='structural')
-            config.model_state = ms
-            return render_model_code(ms)
+            config.session_store.commit(session_id, ms)
+            return new_state_token()
         else:
             raise PreventUpdate
 
@@ -200,10 +200,18 @@ def structural_callbacks(app):
         Input("abs_delay_radio", "value"),
         Input("abs_rate-radio", "value"),
         Input("depot_checklist", "options"),
+        State("session-id", "data"),
         prevent_initial_call=True,
     )
-    def enable_no_of_transits(abs_delay, abs_rate, depot_options):
-        if abs_delay == 'transits' and abs_rate == 'ZO':
+    def enable_no_of_transits(abs_delay, abs_rate, depot_options, session_id):
+        # Transits of the model state (e.g. after undo) are kept
+        transits = get_transits(config.session_store.get(session_id))
+        if abs_delay == 'transits' and transits is not None:
+            number, depot = transits
+            minimum = 2 if abs_rate == 'ZO' else 1
+            depot_options[0]['disabled'] = abs_rate == 'SEQ-ZO-FO'
+            return False, max(number, minimum), minimum, depot_options, ['depot'] if depot else []
+        elif abs_delay == 'transits' and abs_rate == 'ZO':
             depot_options[0]['disabled'] = False
             return False, 2, 2, depot_options, ['depot']
         elif abs_delay == 'transits' and abs_rate != 'SEQ-ZO-FO':
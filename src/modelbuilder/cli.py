@@ -0,0 +1,126 @@
+import argparse
+
+from modelbuilder.server import DEFAULT_HOST, DEFAULT_PORT
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='pharmpy-modelbuilder', description='Pharmpy Model Builder'
+    )
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve_parser = subparsers.add_parser(
+        'serve', help='serve the app with a multi-worker WSGI server'
+    )
+    serve_parser.add_argument('--host', default=DEFAULT_HOST)
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument(
+        '--workers', type=int, default=None, help='worker processes (default: number of cores)'
+    )
+    serve_parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    serve_parser.add_argument(
+        '--no-preload',
+        dest='preload',
+        action='store_false',
+        help='import the app in each worker instead of once before forking',
+    )
+    serve_parser.add_argument(
+        '--keep-alive', type=int, default=5, help='seconds to keep idle connections open'
+    )
+    serve_parser.add_argument(
+        '--timeout', type=int, default=120, help='seconds before a busy worker is restarted'
+    )
+
+    serve_parser.add_argument(
+        '--background',
+        action='store_true',
+        help='render model code in background processes, cancelling superseded renderings',
+    )
+
+    precompute_parser = subparsers.add_parser(
+        'precompute',
+        help='generate the models of the common structural options into the model cache',
+    )
+    precompute_parser.add_argument(
+        '--cache-dir',
+        default=None,
+        help='model cache directory (default: MODELBUILDER_MODEL_CACHE_DIR)',
+    )
+    precompute_parser.add_argument(
+        '--route', dest='routes', action='append', help='administration route (default: all)'
+    )
+    precompute_parser.add_argument(
+        '--format', dest='model_formats', action='append', help='model format (default: all)'
+    )
+
+    build_parser = subparsers.add_parser(
+        'build',
+        help='generate the model and the Python and R scripts of a model state without the app',
+    )
+    build_parser.add_argument('state', help='model state as JSON (see ModelState.to_dict)')
+    build_parser.add_argument(
+        '-o', '--output-dir', default='.', help='directory to write the files to (default: .)'
+    )
+    build_parser.add_argument(
+        '--format', dest='model_format', default=None, help='model format (default: of the state)'
+    )
+    build_parser.add_argument(
+        '--dataset', default=None, help='dataset file (default: the dataset of the state)'
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        from modelbuilder.server import serve
+
+        serve(
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            threads=args.threads,
+            preload=args.preload,
+            keep_alive=args.keep_alive,
+            timeout=args.timeout,
+            background=args.background,
+        )
+    elif args.command == 'precompute':
+        _precompute(args)
+    elif args.command == 'build':
+        _build(args)
+    else:
+        from modelbuilder.app import run
+
+        run()
+
+
+def _precompute(args):
+    import os
+
+    from modelbuilder.internals.model_cache import ModelCache
+    from modelbuilder.internals.precompute import MODEL_FORMATS, ROUTES, precompute
+
+    model_cache = ModelCache(args.cache_dir or os.environ.get('MODELBUILDER_MODEL_CACHE_DIR'))
+
+    def progress(done, total):
+        print(f'\r{done}/{total} models', end='', flush=True)
+
+    failed = precompute(
+        model_cache,
+        routes=args.routes or ROUTES,
+        model_formats=args.model_formats or MODEL_FORMATS,
+        progress=progress,
+    )
+    print(f'\nModels written to {model_cache.path} ({failed} failed)')
+
+
+def _build(args):
+    # NOTE: Does not import dash, so that it starts fast and can be run in batch pipelines
+    from modelbuilder.internals.build import build, load_model_state
+
+    ms = load_model_state(args.state, dataset=args.dataset)
+    for path in build(ms, args.output_dir, model_format=args.model_format):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,79 @@
+import os
+import threading
+from functools import partial
+
 from modelbuilder.internals.model_state import ModelState
+from modelbuilder.internals.session import SessionStore, create_backend
+
+# Expensive callbacks (rendering of the model code) run in background processes when enabled.
+# Requires dash[diskcache]
+background_callbacks = os.environ.get('MODELBUILDER_BACKGROUND_CALLBACKS') == '1'
+background_cache_dir = os.environ.get('MODELBUILDER_BACKGROUND_DIR')
+
+# Model states are stored per browser session. Use the disk backend when running several worker
+# processes or background callbacks so that all processes see the same state.
+session_backend = os.environ.get(
+    'MODELBUILDER_SESSION_BACKEND', 'disk' if background_callbacks else 'memory'
+)
+session_backend_kwargs = {}
+if session_backend == 'disk' and os.environ.get('MODELBUILDER_SESSION_DIR'):
+    session_backend_kwargs['path'] = os.environ['MODELBUILDER_SESSION_DIR']
+
+# Number of model states per session that can be undone
+history_size = int(os.environ.get('MODELBUILDER_HISTORY_SIZE', 50))
+
+session_store = SessionStore(
+    create_backend(session_backend, **session_backend_kwargs),
+    partial(ModelState.create, 'iv'),
+    history_size=history_size,
+)
+
+
+# Edits in the data tables within this many milliseconds are merged into one model state update
+debounce_window = int(os.environ.get('MODELBUILDER_DEBOUNCE_MS', 300))
+
+
+# pharmpy is imported and the default models are generated in a background thread after start,
+# so that the first session does not have to wait for it
+warm_up = os.environ.get('MODELBUILDER_WARM_UP', '1') == '1'
+
+
+def start_warm_up():
+    if not warm_up:
+        return None
+    thread = threading.Thread(target=_warm_up, name='modelbuilder-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+# The models of the common structural options are also generated into the model cache
+# (MODELBUILDER_MODEL_CACHE=1) after start, or with pharmpy-modelbuilder precompute
+precompute_models = os.environ.get('MODELBUILDER_PRECOMPUTE') == '1'
+
+
+def _warm_up():
+    from modelbuilder.internals.help_functions import render_model_code
+    from modelbuilder.internals.model_cache import model_cache
+
+    for model_type in ['oral', 'iv']:
+        render_model_code(ModelState.create(model_type))
+
+    if precompute_models and model_cache is not None:
+        from modelbuilder.internals.precompute import precompute
+
+        precompute(model_cache)
+
+
+def create_background_callback_manager():
+    if not background_callbacks:
+        return None
+
+    import diskcache
+    from dash import DiskcacheManager
+
+    from modelbuilder.internals.cache import get_cache_dir
 
-model_state = ModelState.create('iv')
+    return DiskcacheManager(diskcache.Cache(str(get_cache_dir(background_cache_dir, 'background'))))
 
 
 def make_label_value(key, value):
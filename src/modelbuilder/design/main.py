@@ -1,6 +1,9 @@
 import dash_bootstrap_components as dbc
 from dash import dcc, html
 
+from modelbuilder.callbacks.debounce import DEBOUNCED_TABLES
+from modelbuilder.internals.session import new_session_id
+
 from .covariates import covariate_tab
 from .error_model import error_tab
 from .general import general_tab
@@ -138,3 +141,15 @@ layout = dbc.Container(
     },
     fluid=True,
 )
+
+
+def serve_layout(debounce_window=300):
+    # Every page load starts a new session
+    return html.Div(
+        [
+            dcc.Store(id='session-id', data=new_session_id()),
+            dcc.Store(id='debounce-window', data=debounce_window),
+            *[dcc.Store(id=f'{table_id}-edits') for table_id in DEBOUNCED_TABLES],
+            layout,
+        ]
+    )
@@ -1,25 +1,32 @@
 from dash import dcc, html
 
+from modelbuilder.internals.profiling import profiler
+
 from .style_elements import (
+    create_button,
+    create_checklist,
     create_clipboard,
     create_col,
+    create_col_dict,
     create_container,
     create_empty_line,
     create_input_group_button,
     create_options_list,
     create_radio,
+    create_table,
     create_text,
     create_upload_group_button,
 )
 
+model_format_dict = {
+    'generic': 'generic',
+    'nlmixr': 'nlmixr',
+    'nonmem': 'nonmem',
+    'rxode2': 'rxode',
+}
+
 
 def create_model_format_component():
-    model_format_dict = {
-        'generic': 'generic',
-        'nlmixr': 'nlmixr',
-        'nonmem': 'nonmem',
-        'rxode2': 'rxode',
-    }
     model_format_options = create_options_list(model_format_dict)
 
     model_format_radio = create_radio(
@@ -73,6 +80,12 @@ text_style = {
 }
 
 
+def create_history_component():
+    undo_button = create_button('undo-btn', 'Undo')
+    redo_button = create_button('redo-btn', 'Redo')
+    return create_col([undo_button, redo_button, create_empty_line()])
+
+
 def create_model_code_component():
     model_code_text = create_text('output-model', style=text_style)
     model_code_clipboard = create_clipboard('output-model')
@@ -81,6 +94,7 @@ def create_model_code_component():
     r_code_text = create_text('output-r', style=text_style)
     r_code_clipboard = create_clipboard('output-r')
 
+    # Code is only rendered for the selected tab, see callbacks/model_view.py
     tabs = dcc.Tabs(
         id="model-view-tabs",
         value='output-model',
@@ -108,8 +122,14 @@ def create_model_code_component():
             ),
         ],
     )
+    model_state_token = dcc.Store(id='model-state-token')
+    # Written when the model of the state has been generated, before it is rendered in a
+    # background job, see callbacks/model_view.py
+    model_view_token = dcc.Store(id='model-view-token')
+    # Written on undo and redo, see callbacks/history.py
+    history_token = dcc.Store(id='history-token')
 
-    return tabs
+    return html.Div([tabs, model_state_token, model_view_token, history_token])
 
 
 def create_download_model_component():
@@ -117,11 +137,38 @@ def create_download_model_component():
         [
             create_input_group_button('download-btn', 'model_path', 'Save model', 'model path'),
             html.Div(id="model_confirm"),
+            # The export runs in the background and is polled until done, see callbacks/general.py
+            dcc.Store(id='export-job'),
+            dcc.Interval(id='export-interval', interval=500, disabled=True),
+            dcc.Download(id='model-download'),
             html.Br(),
         ]
     )
 
 
+def create_batch_export_component():
+    # Variants of the current model for a grid, e.g. PERIPHERALS(0..2);ERROR(add,prop,comb). The
+    # progress is shown in model_confirm, see callbacks/general.py
+    batch_export = html.Details(
+        [
+            html.Summary('Batch export'),
+            create_input_group_button(
+                'batch-btn',
+                'batch-grid',
+                'Export variants',
+                'PERIPHERALS(0..2);ELIMINATION([FO,MM]);ERROR(add,prop,comb)',
+            ),
+            create_checklist(
+                'batch-formats',
+                create_options_list(model_format_dict),
+                value=['nonmem'],
+                inline=True,
+            ),
+        ]
+    )
+    return create_col([batch_export, html.Br()])
+
+
 def create_load_dataset_component():
     return create_col(
         [
@@ -129,15 +176,43 @@ def create_load_dataset_component():
                 'upload-dataset', 'dataset-path', 'Load dataset', 'No dataset'
             ),
             html.Div(id="load-dataset"),
+            dcc.Store(id='dataset-upload'),
+        ]
+    )
+
+
+def create_diagnostics_component():
+    # Timings of the model generation, only shown when profiling is enabled (MODELBUILDER_PROFILE=1)
+    columns = [
+        create_col_dict('Category', 'category'),
+        create_col_dict('Step', 'name'),
+        create_col_dict('Calls', 'count', type='numeric'),
+        create_col_dict('Total (ms)', 'total', type='numeric'),
+        create_col_dict('Mean (ms)', 'mean', type='numeric'),
+        create_col_dict('Max (ms)', 'max', type='numeric'),
+    ]
+    diagnostics = html.Details(
+        [
+            html.Summary('Diagnostics'),
+            create_button('diagnostics-refresh-btn', 'Refresh'),
+            create_button('diagnostics-json-btn', 'Download JSON'),
+            create_button('diagnostics-trace-btn', 'Download Chrome trace'),
+            dcc.Download(id='diagnostics-download'),
+            create_table('diagnostics-table', columns, data=[], page_size=20),
         ]
     )
+    style = None if profiler.enabled else {'display': 'none'}
+    return create_col([diagnostics, html.Br()], style=style)
 
 
 model_format_div = create_container(
     [
         create_model_format_component(),
+        create_history_component(),
         create_model_code_component(),
         create_download_model_component(),
+        create_batch_export_component(),
         create_load_dataset_component(),
+        create_diagnostics_component(),
     ]
 )
@@ -84,9 +84,10 @@ def create_input_group_button(button_id, input_id, button_text, default_value):
 
 def create_upload_group_button(button_id, input_id, button_text, default_value):
     style = {"fontSize": "medium"}
+    # NOTE: The file is selected and uploaded by assets/upload.js
     return dbc.InputGroup(
         [
-            dcc.Upload(dbc.Button(button_text, color=btn_color), id=button_id, style=style),
+            dbc.Button(button_text, id=button_id, color=btn_color, style=style),
             dbc.Input(id=input_id, placeholder=default_value),
         ]
     )
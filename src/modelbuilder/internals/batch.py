@@ -0,0 +1,148 @@
+import itertools
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .dataset import DatasetHandle, dataset_store
+from .export import write_dataset, write_model_file
+from .model_state import update_model_state
+
+# The base error model, all other terms of a grid are structural MFL features
+ERROR_TERM = 'ERROR'
+ERROR_BASES = ('add', 'prop', 'comb')
+
+_TERM_PATTERN = re.compile(r'\s*([A-Z]+)\s*\(\s*\[?([^()\[\]]*)\]?\s*\)\s*')
+_RANGE_PATTERN = re.compile(r'(\d+)\.\.(\d+)')
+
+
+def parse_grid(spec):
+    # A grid in MFL style, e.g. 'PERIPHERALS(0..2);ELIMINATION([FO,MM]);ERROR(add,prop,comb)',
+    # as a list of (term, options)
+    grid = []
+    for term in filter(str.strip, spec.split(';')):
+        match = _TERM_PATTERN.fullmatch(term)
+        if match is None:
+            raise ValueError(f'Invalid grid term: {term!r}')
+        name, args = match.groups()
+        options = []
+        for arg in filter(None, (arg.strip() for arg in args.split(','))):
+            if range_match := _RANGE_PATTERN.fullmatch(arg):
+                start, stop = map(int, range_match.groups())
+                options.extend(str(n) for n in range(start, stop + 1))
+            else:
+                options.append(arg)
+        if not options:
+            raise ValueError(f'No options in grid term: {term!r}')
+        grid.append((name, options))
+    return grid
+
+
+def get_variants(ms, spec):
+    # The model state of each combination in the grid, as (name, options, model state). The
+    # structural features are changed first, like in the Structural tab, and then the base error
+    # model of the first DV. The add-ons of the error models and the other DVs are kept.
+    grid = parse_grid(spec)
+    name = ms.model_attrs.get('name') or 'model'
+    variants = []
+    for combination in itertools.product(*(options for _, options in grid)):
+        options = dict(zip((term for term, _ in grid), combination))
+        mfl = ';'.join(
+            f'{term}({option})' for term, option in options.items() if term != ERROR_TERM
+        )
+        ms_variant = ms
+        if mfl:
+            ms_variant = update_model_state(ms_variant, mfl, type='structural')
+        if ERROR_TERM in options:
+            error = {
+                dv: ';'.join(func for func in funcs if func not in ERROR_BASES)
+                for dv, funcs in ms.error_funcs.items()
+            }
+            error[1] = options[ERROR_TERM]
+            ms_variant = update_model_state(ms_variant, error=error)
+        # NOTE: The name is set when the model is written, since the pipeline stages after a
+        # change of the name could not be shared between the variants
+        variants.append(('_'.join([name] + list(combination)), options, ms_variant))
+    return variants
+
+
+def export_variants(
+    ms, spec, path, model_formats=None, max_workers=None, mp_context=None, progress=None
+):
+    # Generates each variant of the grid in each model format into path/<model format>/ on a
+    # process pool, and writes path/manifest.json. The dataset is written once to path and all
+    # models refer to it. Returns the manifest.
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    if model_formats is None:
+        model_formats = [ms.model_format]
+    variants = get_variants(ms, spec)
+
+    dataset_path = None
+    if ms.dataset is not None:
+        # NOTE: The variants only differ in structure and error model, so they all have the
+        # dataset of ms
+        dataset, datainfo = ms.get_attached_dataset()
+        dataset_path = path / f'{ms.model_attrs.get("name") or "model"}.csv'
+        write_dataset(dataset, dataset_path, datainfo.missing_data_token)
+        if not isinstance(ms.dataset, DatasetHandle):
+            # The worker processes load the dataset from the dataset store, instead of getting a
+            # copy of the DataFrame with each task
+            with open(dataset_path, 'rb') as f:
+                handle = DatasetHandle(dataset_store.add(f), dataset_path.name)
+            variants = [
+                (variant_name, options, ms_variant.replace(dataset=handle))
+                for variant_name, options, ms_variant in variants
+            ]
+
+    # Variants with the same structural options share the pipeline stages up to the error model,
+    # and the formats of a variant share all stages but the last. Each such group is one task,
+    # so that it is generated by one worker process and reuses the stage cache there.
+    groups = {}
+    for variant_name, options, ms_variant in variants:
+        structural = tuple((term, option) for term, option in options.items() if term != ERROR_TERM)
+        groups.setdefault(structural, []).append((variant_name, ms_variant))
+
+    entries = {}
+    max_workers = min(max_workers or os.cpu_count() or 1, len(groups))
+    with ProcessPoolExecutor(max_workers, mp_context=mp_context) as executor:
+        futures = [
+            executor.submit(_export_group, group, path, model_formats, dataset_path)
+            for group in groups.values()
+        ]
+        for i, future in enumerate(as_completed(futures), start=1):
+            entries.update(future.result())
+            if progress is not None:
+                progress(i, len(futures))
+
+    manifest = {
+        'spec': spec,
+        'model_formats': list(model_formats),
+        'dataset': dataset_path.name if dataset_path is not None else None,
+        'variants': [
+            {'name': variant_name, 'options': options, **entries[variant_name]}
+            for variant_name, options, _ in variants
+        ],
+    }
+    with open(path / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _export_group(group, path, model_formats, dataset_path):
+    # Runs in a worker process
+    entries = {}
+    for variant_name, ms_variant in group:
+        models, errors = {}, {}
+        for model_format in model_formats:
+            try:
+                model = ms_variant.replace(model_format=model_format).generate_model()
+                model = model.replace(name=variant_name)
+                model_path = write_model_file(model, path / model_format, dataset_path)
+                models[model_format] = model_path.relative_to(path).as_posix()
+            except Exception as e:
+                # NOTE: Not all combinations can be generated or converted to all formats
+                errors[model_format] = str(e)
+        entries[variant_name] = {'models': models, 'errors': errors}
+    return entries
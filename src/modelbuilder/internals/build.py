@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+from .export import write_dataset, write_model_file
+from .model_state import ModelState, generate_code
+
+# Added to the generated code so that the scripts can be run as is
+SCRIPT_HEADERS = {
+    'python': 'from pathlib import Path\n\nfrom pharmpy.modeling import *\n\n',
+    'r': 'library(pharmr)\n\n',
+}
+SCRIPT_SUFFIXES = {'python': '_pharmpy.py', 'r': '_pharmr.R'}
+# The dataset in the scripts. It is relative to the Python script. An R script has no portable
+# way to find its own path, so there it is relative to the working directory.
+SCRIPT_DATASETS = {
+    'python': lambda name: f'Path(__file__).parent / {name!r}',
+    'r': repr,
+}
+SCRIPT_DATASET_NOTES = {
+    'python': '',
+    'r': '# Run in the directory of this script, the dataset is relative to it\n',
+}
+
+
+def load_model_state(path, dataset=None):
+    # A model state serialized with ModelState.to_dict. A dataset file is relative to the state
+    # file, and is replaced by dataset if given.
+    path = Path(path)
+    with open(path) as f:
+        d = json.load(f)
+    if dataset is not None:
+        d['dataset'] = str(dataset)
+    elif isinstance(d.get('dataset'), str):
+        d['dataset'] = str(path.parent / d['dataset'])
+    return ModelState.from_dict(d)
+
+
+def build(ms, path, model_format=None):
+    # Writes the model (with its dataset), and the Python and R scripts that generate it, into
+    # the directory path. Returns the written files.
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    if model_format is not None and model_format != ms.model_format:
+        ms = ms.replace(model_format=model_format)
+    funcs, model = ms.list_functions()
+
+    files = []
+    dataset_path = None
+    if model.dataset is not None:
+        dataset_path = path / f'{model.name}.csv'
+        write_dataset(model.dataset, dataset_path, model.datainfo.missing_data_token)
+        files.append(dataset_path)
+    files.append(write_model_file(model, path, dataset_path))
+
+    for language, header in SCRIPT_HEADERS.items():
+        code = generate_code(funcs, language)
+        if dataset_path is not None:
+            dataset = SCRIPT_DATASETS[language](dataset_path.name)
+            code = SCRIPT_DATASET_NOTES[language] + code.replace("'path/to/dataset'", dataset)
+        script_path = path / f'{model.name}{SCRIPT_SUFFIXES[language]}'
+        script_path.write_text(header + code)
+        files.append(script_path)
+    return files
@@ -0,0 +1,115 @@
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from threading import RLock
+
+
+class LRUCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+def get_cache_dir(path, name):
+    # Directory of a cache or store, by default name in the cache directory of the user
+    # (~/.cache/pharmpy-modelbuilder). Pickled files are loaded from these directories, so they
+    # are only accessible by the user and a directory owned by another user is refused.
+    if path is None:
+        root = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+        root.mkdir(parents=True, exist_ok=True)
+        path = _make_private_dir(root / 'pharmpy-modelbuilder') / name
+    return _make_private_dir(Path(path))
+
+
+def _make_private_dir(path):
+    # mkdir only sets the mode of the last directory, and not of an existing directory
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if hasattr(os, 'getuid') and path.stat().st_uid != os.getuid():
+        raise PermissionError(f'Directory {path} is owned by another user')
+    return path
+
+
+@contextmanager
+def atomic_write(path, mode='wb', dir=None):
+    # Writes to a temporary file that replaces path when done, so that other processes never see
+    # a partial file. path can also be a function that gives the path once the file is written,
+    # the temporary file is then in dir.
+    fd, tmp_path = tempfile.mkstemp(dir=dir or Path(path).parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path() if callable(path) else path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def prune_expired(paths, max_age, remove=Path.unlink):
+    # Removes the paths that have not been modified for max_age seconds
+    cutoff = time.time() - max_age
+    for path in paths:
+        try:
+            if path.stat().st_mtime < cutoff:
+                remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def check_id(value, length, kind):
+    # Ids come from the browser and are used as file names
+    if not isinstance(value, str) or not re.fullmatch(f'[0-9a-f]{{{length}}}', value):
+        raise ValueError(f'Invalid {kind} id: {value!r}')
+
+
+class IdentityKey:
+    # Key on object identity. Holding a reference keeps the id from being reused while the key
+    # is alive, which makes it safe to use unhashable objects such as DataFrames in cache keys.
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return isinstance(other, IdentityKey) and self.obj is other.obj
+
+    def __repr__(self):
+        return f"<IdentityKey({type(self.obj).__name__} at {id(self.obj):#x})>"
@@ -0,0 +1,200 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from pharmpy.internals.module.lazy import LazyImport
+
+from .cache import LRUCache
+from .dataset import DatasetHandle
+from .model_state import _object_key, get_datainfo
+
+np = LazyImport('np', globals(), 'numpy')
+pd = LazyImport('pd', globals(), 'pandas')
+
+# Columns that vary within ID with at most this many values are candidate occasion columns
+MAX_OCCASIONS = 20
+# Integer covariates with at most this many values are suggested as categorical
+MAX_CATEGORIES = 5
+# Rows checked first when counting the values of a column that varies within ID
+SAMPLE_ROWS = 10_000
+
+# Column profiles per dataset, keyed as the attached datasets in model_state
+_profile_cache = LRUCache(maxsize=32)
+
+
+@dataclass(frozen=True)
+class ColumnProfile:
+    name: str
+    # Type of the column in the datainfo, e.g. 'id', 'dv' or 'unknown'
+    type: str
+    numeric: bool
+    integer: bool
+    # Number of values, for columns that vary within ID only counted up to MAX_OCCASIONS + 1
+    cardinality: int
+    min: Optional[float]
+    max: Optional[float]
+    missing: int
+    # Constant within each ID, e.g. a baseline covariate, or varying within ID, e.g. an occasion
+    constant_within_id: bool
+    # Correlation between the values of the IDs and the mean observation of the IDs
+    dv_correlation: Optional[float] = None
+
+    @property
+    def varies_within_id(self):
+        return not self.constant_within_id
+
+    @property
+    def is_covariate(self):
+        return self.type in ('covariate', 'unknown')
+
+    @property
+    def is_occasion(self):
+        return (
+            self.is_covariate
+            and self.varies_within_id
+            and self.numeric
+            and self.missing == 0
+            and 1 < self.cardinality <= MAX_OCCASIONS
+        )
+
+    @property
+    def suggested_effect(self):
+        if not self.numeric or self.cardinality <= 2:
+            return 'cat'
+        if self.integer and self.cardinality <= MAX_CATEGORIES:
+            return 'cat'
+        if self.constant_within_id and self.min > 0:
+            # E.g. weight, where an allometric (power) effect is common
+            return 'pow'
+        return 'lin'
+
+
+def get_column_profiles(dataset):
+    # Profiles of all columns of a dataset (handle or DataFrame), computed once per dataset
+    key = _object_key(dataset)
+    profiles = _profile_cache.get(key)
+    if profiles is None:
+        datainfo = get_datainfo(dataset)
+        if isinstance(dataset, DatasetHandle):
+            dataset = dataset.load()
+        types = {column.name: column.type for column in datainfo}
+        profiles = profile_columns(dataset, types)
+        _profile_cache.put(key, profiles)
+    return profiles
+
+
+def rank_covariates(profiles):
+    # Candidate covariates, baseline covariates first and then by the strength of the correlation
+    # with the observations
+    def _key(profile):
+        correlation = profile.dv_correlation
+        return (profile.varies_within_id, -abs(correlation) if correlation is not None else 0)
+
+    return sorted((p for p in profiles.values() if p.is_covariate), key=_key)
+
+
+def profile_columns(df, types):
+    # All columns are profiled with vectorized operations over all rows and reductions per ID
+    # (as a groupby would do). The rows are ordered by ID if they are not already grouped, so
+    # that the IDs are contiguous and a change in value within an ID is a change from the
+    # previous row.
+    id_names = [name for name, type in types.items() if type == 'id' and name in df.columns]
+    if id_names:
+        ids = df[id_names[0]].to_numpy()
+        starts = _get_starts(ids)
+        if np.count_nonzero(starts) != len(pd.unique(ids)):
+            order = np.argsort(ids, kind='stable')
+            df = df.iloc[order]
+            starts = _get_starts(ids[order])
+    else:
+        starts = np.zeros(len(df), dtype=bool)
+        starts[:1] = True
+
+    dv_means = _get_dv_means(df, types, starts)
+
+    profiles = {}
+    for name in df.columns:
+        profiles[name] = _profile_column(df[name], types.get(name, 'unknown'), starts, dv_means)
+    return profiles
+
+
+def _get_starts(ids):
+    # True for the first row of each ID
+    starts = np.empty(len(ids), dtype=bool)
+    starts[:1] = True
+    starts[1:] = ids[1:] != ids[:-1]
+    return starts
+
+
+def _get_dv_means(df, types, starts):
+    # Mean observation of each ID (dose records excluded)
+    dv_names = [name for name, type in types.items() if type == 'dv' and name in df.columns]
+    if not dv_names or not len(df) or not pd.api.types.is_numeric_dtype(df[dv_names[0]]):
+        return None
+    dv = df[dv_names[0]].to_numpy(dtype=float)
+    observation = ~np.isnan(dv)
+    for name, type in types.items():
+        if type == 'dose' and name in df.columns and pd.api.types.is_numeric_dtype(df[name]):
+            observation &= ~(df[name].to_numpy(dtype=float) > 0)
+    group_starts = np.flatnonzero(starts)
+    sums = np.add.reduceat(np.where(observation, dv, 0.0), group_starts)
+    counts = np.add.reduceat(observation.astype(np.int64), group_starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def _profile_column(column, type, starts, dv_means):
+    numeric = pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+    missing = column.isna().to_numpy()
+    if not numeric:
+        # NONMEM datasets use '.' for missing values
+        missing = missing | (column.astype(str) == '.').to_numpy()
+    values = column.to_numpy()
+
+    changed = values[1:] != values[:-1]
+    changed &= ~(missing[1:] & missing[:-1]) & ~starts[1:]
+    constant_within_id = not changed.any()
+
+    id_values = values[starts]
+    if constant_within_id:
+        # One value per ID is enough
+        cardinality = pd.Series(id_values).nunique()
+    else:
+        # NOTE: Counting all values of e.g. DV or TIME is the slowest part of the profile, the
+        # exact number is not needed when there are already too many for an occasion column
+        cardinality = column.iloc[:SAMPLE_ROWS].nunique()
+        if cardinality <= MAX_OCCASIONS:
+            cardinality = column.nunique()
+        cardinality = min(cardinality, MAX_OCCASIONS + 1)
+
+    integer = False
+    minimum = maximum = dv_correlation = None
+    if numeric and cardinality:
+        minimum, maximum = float(column.min()), float(column.max())
+        if pd.api.types.is_integer_dtype(column):
+            integer = True
+        else:
+            present = values[~missing].astype(float)
+            integer = bool(np.all(np.mod(present, 1) == 0))
+        if constant_within_id and dv_means is not None and type in ('covariate', 'unknown'):
+            dv_correlation = _correlation(id_values.astype(float), dv_means)
+
+    return ColumnProfile(
+        name=column.name,
+        type=type,
+        numeric=numeric,
+        integer=integer,
+        cardinality=int(cardinality),
+        min=minimum,
+        max=maximum,
+        missing=int(missing.sum()),
+        constant_within_id=constant_within_id,
+        dv_correlation=dv_correlation,
+    )
+
+
+def _correlation(x, y):
+    mask = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[mask], y[mask]
+    if len(x) < 3 or np.ptp(x) == 0 or np.ptp(y) == 0:
+        return None
+    return float(np.corrcoef(x, y)[0, 1])
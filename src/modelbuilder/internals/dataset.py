@@ -0,0 +1,187 @@
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+
+from pharmpy.internals.module.lazy import LazyImport
+
+from .cache import LRUCache, atomic_write, check_id, get_cache_dir, prune_expired
+
+pd = LazyImport('pd', globals(), 'pandas')
+
+# Bytes read to find the delimiter and the column types
+SAMPLE_SIZE = 64 * 1024
+# Rows parsed at a time, progress is reported after each chunk
+CHUNKSIZE = 100_000
+# Bytes read at a time when storing an upload
+BLOCKSIZE = 1024 * 1024
+# Largest dataset that can be uploaded
+MAX_UPLOAD_SIZE = int(os.environ.get('MODELBUILDER_MAX_UPLOAD_MB', 1024)) * 1024 * 1024
+
+
+def read_dataset(path, chunksize=CHUNKSIZE, progress=None):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        sample = f.read(SAMPLE_SIZE)
+        options = get_read_options(sample)
+        dtype = _get_sample_dtypes(sample, options)
+        try:
+            f.seek(0)
+            return _read_chunks(f, size, options, dtype, chunksize, progress)
+        except (ValueError, TypeError):
+            # A column has values of another type than in the sample, e.g. missing values further
+            # down. All columns are read as text and the numeric columns converted, so that the
+            # types are the same in all chunks (as when pandas reads the whole file).
+            f.seek(0)
+            df = _read_chunks(f, size, options, str, chunksize, progress)
+            for column in df.columns:
+                try:
+                    df[column] = pd.to_numeric(df[column])
+                except (ValueError, TypeError):
+                    pass
+            return df
+
+
+def get_read_options(sample):
+    # NONMEM style datasets are separated with either commas or whitespace
+    header = sample.split(b'\n', 1)[0]
+    if b',' in header:
+        return {'sep': ',', 'skipinitialspace': True}
+    return {'sep': r'\s+'}
+
+
+def _get_sample_dtypes(sample, options):
+    # Only complete lines, the sample can end in the middle of a line
+    if len(sample) == SAMPLE_SIZE:
+        sample = sample[: sample.rfind(b'\n') + 1]
+    try:
+        df = pd.read_csv(io.BytesIO(sample), engine='c', **options)
+    except (ValueError, pd.errors.ParserError):
+        return None
+    return df.dtypes.to_dict()
+
+
+def _read_chunks(f, size, options, dtype, chunksize, progress):
+    chunks = []
+    with pd.read_csv(
+        f, engine='c', dtype=dtype, chunksize=chunksize, encoding='utf-8', **options
+    ) as reader:
+        for chunk in reader:
+            chunks.append(chunk)
+            if progress is not None:
+                progress(min(f.tell() / size, 1.0) if size else 1.0)
+    return pd.concat(chunks, ignore_index=True)
+
+
+class DatasetTooLargeError(ValueError):
+    pass
+
+
+class DatasetExpiredError(FileNotFoundError):
+    # A dataset that is still referenced by a model state but has been pruned from the store
+    def __init__(self, dataset_id):
+        super().__init__('Dataset expired, please re-upload')
+        self.dataset_id = dataset_id
+
+
+@dataclass(frozen=True)
+class DatasetHandle:
+    # Reference to an uploaded dataset in the dataset store, which is what is kept in the model
+    # state (and thus in the sessions) instead of the data
+    id: str
+    name: str
+
+    def load(self, columns=None, progress=None):
+        return dataset_store.load(self.id, columns=columns, progress=progress)
+
+
+class DatasetStore:
+    # Uploaded datasets stored by the sha256 of their content, so that the same file is stored and
+    # parsed once for all sessions. The directory can be shared between processes. Datasets that
+    # have not been uploaded for max_age seconds are removed.
+    #
+    # With pyarrow installed, a parsed dataset is also written as an Arrow file which is memory
+    # mapped when loaded. The processes then share the data through the page cache, and only the
+    # columns that are asked for are copied into a DataFrame.
+    def __init__(
+        self, path=None, max_age=7 * 24 * 60 * 60, maxsize=8, max_upload_size=MAX_UPLOAD_SIZE
+    ):
+        self.path = get_cache_dir(path, 'datasets')
+        self.max_age = max_age
+        self.max_upload_size = max_upload_size
+        self._datasets = LRUCache(maxsize=maxsize)
+
+    def add(self, stream):
+        # Written to a temporary file while hashing, so the upload is never fully in memory
+        digest = hashlib.sha256()
+
+        def dataset_path():
+            path = self._dataset_path(digest.hexdigest())
+            if not path.exists():
+                self.prune()
+            return path
+
+        with atomic_write(dataset_path, dir=self.path) as f:
+            size = 0
+            while block := stream.read(BLOCKSIZE):
+                size += len(block)
+                if size > self.max_upload_size:
+                    raise DatasetTooLargeError(
+                        f'Dataset larger than {self.max_upload_size // (1024 * 1024)} MB'
+                    )
+                digest.update(block)
+                f.write(block)
+        return digest.hexdigest()
+
+    def load(self, dataset_id, columns=None, progress=None):
+        check_id(dataset_id, 64, 'dataset')
+        dataset = self._datasets.get(dataset_id)
+        if dataset is None:
+            pa = _import_pyarrow()
+            try:
+                if pa is None:
+                    dataset = read_dataset(self._dataset_path(dataset_id), progress=progress)
+                else:
+                    dataset = self._load_table(pa, dataset_id, progress)
+            except FileNotFoundError as e:
+                # Datasets are pruned after max_age even if a session still refers to them
+                raise DatasetExpiredError(dataset_id) from e
+            self._datasets.put(dataset_id, dataset)
+        if isinstance(dataset, pd.DataFrame):
+            return dataset if columns is None else dataset[list(columns)]
+        if columns is not None:
+            dataset = dataset.select(list(columns))
+        return dataset.to_pandas()
+
+    def _load_table(self, pa, dataset_id, progress):
+        arrow_path = self.path / f'{dataset_id}.arrow'
+        if not arrow_path.exists():
+            df = read_dataset(self._dataset_path(dataset_id), progress=progress)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            del df
+            with atomic_write(arrow_path) as f, pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+        return pa.ipc.open_file(pa.memory_map(str(arrow_path))).read_all()
+
+    def prune(self):
+        prune_expired(self.path.glob('*.dataset'), self.max_age, self._remove)
+
+    def _remove(self, dataset_path):
+        dataset_path.unlink()
+        dataset_path.with_suffix('.arrow').unlink(missing_ok=True)
+
+    def _dataset_path(self, dataset_id):
+        return self.path / f'{dataset_id}.dataset'
+
+
+def _import_pyarrow():
+    # Optional, install with pharmpy-modelbuilder[arrow]
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa F401
+    except ImportError:
+        return None
+    return pa
+
+
+dataset_store = DatasetStore(os.environ.get('MODELBUILDER_DATASET_DIR'))
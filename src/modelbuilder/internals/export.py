@@ -0,0 +1,262 @@
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pharmpy.internals.module.lazy import LazyImport
+
+from .cache import atomic_write, check_id, get_cache_dir, prune_expired
+from .profiling import profiler
+
+modeling = LazyImport('modeling', globals(), 'pharmpy.modeling')
+
+# Rows written at a time, progress is reported after each chunk
+CHUNKSIZE = 100_000
+
+# Number of missed heartbeats after which a queued or running job is failed
+STALE_HEARTBEATS = 6
+
+
+def write_model_files(model, path, chunksize=CHUNKSIZE, progress=None):
+    # Writes the model and its dataset into the directory path and returns the written files. The
+    # dataset is written here in chunks rather than by write_model in one go, the model then
+    # refers to it (e.g. in $DATA)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    dataset_path = path / f'{model.name}.csv'
+    with profiler.timed('write_dataset', 'export'):
+        write_dataset(
+            model.dataset, dataset_path, model.datainfo.missing_data_token, chunksize, progress
+        )
+    with profiler.timed('write_model', 'export'):
+        model_path = write_model_file(model, path, dataset_path)
+    return [model_path, dataset_path]
+
+
+def write_model_file(model, path, dataset_path=None):
+    # Writes the model into the directory path, referring to the dataset at dataset_path
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    model_path = path / f'{model.name}{model.filename_extension}'
+    if dataset_path is None:
+        # write_model needs a dataset for NONMEM models
+        model_path.write_text(model.code, encoding='latin-1')
+    else:
+        model = model.replace(datainfo=model.datainfo.replace(path=Path(dataset_path).resolve()))
+        modeling.write_model(model, path=model_path, force=True)
+    return model_path
+
+
+def write_model_state(model_state, path, dataset_path=None):
+    # Writes the model state as state.json into the directory path, for pharmpy-modelbuilder
+    # build. The dataset is the file at dataset_path (relative to state.json) instead of a handle
+    # in the dataset store, so that the files can be built anywhere.
+    d = model_state.replace(dataset=None).to_dict()
+    if dataset_path is not None:
+        d['dataset'] = Path(os.path.relpath(dataset_path, path)).as_posix()
+    state_path = Path(path) / 'state.json'
+    with open(state_path, 'w') as f:
+        json.dump(d, f, indent=2)
+    return state_path
+
+
+def write_dataset(df, path, na_rep, chunksize=CHUNKSIZE, progress=None):
+    with open(path, 'w', newline='') as f:
+        for start in range(0, max(len(df), 1), chunksize):
+            chunk = df.iloc[start : start + chunksize]
+            chunk.to_csv(f, header=start == 0, index=False, na_rep=na_rep)
+            if progress is not None:
+                progress(min((start + chunksize) / len(df), 1.0) if len(df) else 1.0)
+
+
+def write_archive(files, path, root=None):
+    # The files are streamed into the archive, so they are never fully in memory. Files are put
+    # in the archive by their path relative to root, or by name.
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_path in files:
+            file_path = Path(file_path)
+            arcname = file_path.relative_to(root) if root is not None else file_path.name
+            archive.write(file_path, arcname=arcname)
+    return path
+
+
+class ExportQueue:
+    # Models (with their datasets) are exported in background threads. The status and the zip
+    # archive of each job are files in path, so that any process sharing the directory can report
+    # the progress and serve the result. Jobs older than max_age seconds are removed. The variants
+    # of a batch export are generated by batch_workers processes (default one per CPU).
+    #
+    # The status file of each queued or running job is touched every heartbeat seconds by the
+    # process running it. A job whose status has not been touched for STALE_HEARTBEATS heartbeats
+    # (e.g. the worker process was restarted) is reported as failed.
+    def __init__(
+        self, path=None, max_workers=2, max_age=24 * 60 * 60, batch_workers=None, heartbeat=10
+    ):
+        self.path = get_cache_dir(path, 'exports')
+        self.max_workers = max_workers
+        self.max_age = max_age
+        self.batch_workers = batch_workers
+        self.heartbeat = heartbeat
+        self._executor = None
+        self._jobs = set()
+        self._lock = threading.Lock()
+
+    def submit(self, model_state, target=None):
+        # The model is generated in the job as well. With a target path the files are also written
+        # there on the server, as the Save model button always did.
+        return self._submit(self._export_model, model_state, target)
+
+    def submit_batch(self, model_state, spec, model_formats=None):
+        # The variants of a grid, see internals/batch.py. The grid is checked before it is queued.
+        from .batch import parse_grid
+
+        parse_grid(spec)
+        return self._submit(self._export_variants, model_state, spec, model_formats)
+
+    def _submit(self, export, *args):
+        self.prune()
+        job_id = uuid.uuid4().hex
+        self._job_path(job_id).mkdir()
+        self._set_status(job_id, 'queued', 'Waiting to be exported')
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix='modelbuilder-export'
+                )
+                threading.Thread(
+                    target=self._beat, name='modelbuilder-export-heartbeat', daemon=True
+                ).start()
+            self._jobs.add(job_id)
+            future = self._executor.submit(self._run, job_id, export, *args)
+        return job_id, future
+
+    def status(self, job_id):
+        check_id(job_id, 32, 'job')
+        status_path = self._job_path(job_id) / 'status.json'
+        try:
+            with open(status_path) as f:
+                status = json.load(f)
+            last_beat = status_path.stat().st_mtime
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if status['state'] in ('queued', 'running'):
+            if time.time() - last_beat > STALE_HEARTBEATS * self.heartbeat:
+                return dict(status, state='failed', message='Export failed: the export stopped')
+        return status
+
+    def archive_path(self, job_id):
+        check_id(job_id, 32, 'job')
+        status = self.status(job_id)
+        if status is None or status['state'] != 'done':
+            return None
+        return self._job_path(job_id) / status['archive']
+
+    def prune(self):
+        job_paths = (job_path for job_path in self.path.iterdir() if job_path.is_dir())
+        prune_expired(job_paths, self.max_age, shutil.rmtree)
+
+    def _run(self, job_id, export, *args):
+        try:
+            try:
+                message, archive = export(job_id, *args)
+            except Exception as e:
+                self._set_status(job_id, 'failed', f'Export failed: {e}')
+                raise
+            finally:
+                shutil.rmtree(self._job_path(job_id) / 'files', ignore_errors=True)
+            self._set_status(job_id, 'done', message, archive=archive.name)
+        finally:
+            with self._lock:
+                self._jobs.discard(job_id)
+
+    def _beat(self):
+        # Only the modification time is updated, so a status is never overwritten
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                jobs = list(self._jobs)
+            for job_id in jobs:
+                try:
+                    os.utime(self._job_path(job_id) / 'status.json')
+                except FileNotFoundError:
+                    pass
+
+    def _export_model(self, job_id, model_state, target):
+        self._set_status(job_id, 'running', 'Generating model')
+        model = model_state.generate_model()
+        if target is not None:
+            target = Path(target)
+            if target.suffix:
+                # A file name, the model is named after it like in write_model
+                model = model.replace(name=target.stem)
+                target = target.parent
+
+        def progress(fraction):
+            self._set_status(job_id, 'running', f'Writing {model.name}.csv ({fraction:.0%})')
+
+        files_path = self._job_path(job_id) / 'files'
+        files = write_model_files(model, files_path, progress=progress)
+        files.append(write_model_state(model_state, files_path, files[1]))
+        self._set_status(job_id, 'running', f'Compressing {model.name}.zip')
+        archive = write_archive(files, self._job_path(job_id) / f'{model.name}.zip')
+        if target is not None:
+            target.mkdir(parents=True, exist_ok=True)
+            for file_path in files:
+                shutil.copy2(file_path, target / file_path.name)
+            return f'Model written to {target}', archive
+        return 'Model exported', archive
+
+    def _export_variants(self, job_id, model_state, spec, model_formats):
+        from .batch import export_variants
+
+        def progress(done, total):
+            self._set_status(job_id, 'running', f'Generating variants ({done}/{total})')
+
+        self._set_status(job_id, 'running', 'Generating variants')
+        files_path = self._job_path(job_id) / 'files'
+        # Spawned, forking a process with threads (e.g. a server) is not safe
+        manifest = export_variants(
+            model_state,
+            spec,
+            files_path,
+            model_formats,
+            max_workers=self.batch_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            progress=progress,
+        )
+        name = model_state.model_attrs.get('name') or 'model'
+        self._set_status(job_id, 'running', f'Compressing {name}_variants.zip')
+        files = sorted(file_path for file_path in files_path.rglob('*') if file_path.is_file())
+        archive = write_archive(
+            files, self._job_path(job_id) / f'{name}_variants.zip', root=files_path
+        )
+        failed = sum(1 for variant in manifest['variants'] if variant['errors'])
+        message = f'{len(manifest["variants"])} variants exported'
+        if failed:
+            message += f', {failed} with errors (see manifest.json)'
+        return message, archive
+
+    def _set_status(self, job_id, state, message, **kwargs):
+        status = {'state': state, 'message': message, **kwargs}
+        with atomic_write(self._job_path(job_id) / 'status.json', 'w') as f:
+            json.dump(status, f)
+
+    def _job_path(self, job_id):
+        return self.path / job_id
+
+
+def _create_export_queue():
+    batch_workers = os.environ.get('MODELBUILDER_BATCH_WORKERS')
+    return ExportQueue(
+        os.environ.get('MODELBUILDER_EXPORT_DIR'),
+        batch_workers=int(batch_workers) if batch_workers else None,
+    )
+
+
+export_queue = _create_export_queue()
@@ -1,21 +1,129 @@
-from pharmpy.model import Model
-from pharmpy.modeling import get_model_code
+import uuid
 
+from pharmpy.internals.module.lazy import LazyImport
+
+from .cache import LRUCache
+from .model_cache import model_cache
 from .model_state import ModelState, generate_code
+from .profiling import profiler
+
+pharmpy_model = LazyImport('pharmpy_model', globals(), 'pharmpy.model')
+modeling = LazyImport('modeling', globals(), 'pharmpy.modeling')
+
+# Values of the model-view-tabs, which are also the ids of the text areas
+CODE_VIEWS = ('output-model', 'output-python', 'output-r')
+
+# Rendered code per view, keyed by the generated model and its function list
+_render_cache = LRUCache(maxsize=256)
+# Rendered code per view, keyed by model state fingerprint
+_view_cache = LRUCache(maxsize=256)
 
 
 def render_model_code(ms: ModelState):
+    return tuple(render_model_view(ms, view) for view in CODE_VIEWS)
+
+
+def render_model_view(ms: ModelState, view):
+    with profiler.timed(view, 'render_model_code'):
+        key = (view, ms.fingerprint)
+        code = _view_cache.get(key)
+        if code is None and model_cache is not None:
+            code = model_cache.get(ms.fingerprint, view)
+        if code is None:
+            code = _render_model_view(ms, view)
+            if model_cache is not None:
+                model_cache.put(ms.fingerprint, view, code)
+        _view_cache.put(key, code)
+        return code
+
+
+def _render_model_view(ms, view):
     funcs, model = ms.list_functions()
+    code_python = generate_code(funcs, 'python')
+    if view == 'output-python':
+        return code_python
+    key = (view, _model_key(model), code_python)
+    if view == 'output-model':
+        return _cached_render(key, lambda: _render_model_code(model))
+    elif view == 'output-r':
+        return _cached_render(key, lambda: generate_code(funcs, 'r'))
+    raise ValueError(f'Unknown view: {view}')
+
+
+def new_state_token():
+    # Written to the model-state-token store whenever the model state changes, which triggers
+    # rendering of the visible code view
+    return uuid.uuid4().hex
+
+
+def get_structural_values(ms: ModelState):
+    # Values of abs_rate-radio, elim_radio, peripheral-radio and abs_delay_radio for a model
+    # state, as they were set when the state was made
+    mfl = ms.mfl
+    if ms.model_type == 'iv':
+        abs_rate = 0
+        abs_delay = 0
+    else:
+        abs_rate = _get_feature(mfl.absorption, 'type', 'FO')
+        if _get_feature(mfl.lagtime, 'on', False):
+            abs_delay = 'LAGTIME(ON);TRANSITS(0)'
+        elif get_transits(ms) is not None:
+            abs_delay = 'transits'
+        else:
+            abs_delay = 'LAGTIME(OFF);TRANSITS(0)'
+    elim = _get_feature(mfl.elimination, 'type', 'FO')
+    peripherals = _get_feature(mfl.peripherals, 'number', 0)
+    return abs_rate, elim, peripherals, abs_delay
+
+
+def get_transits(ms: ModelState):
+    # Number of transits and whether there is a depot, None without transits
+    number = _get_feature(ms.mfl.transits, 'number', 0)
+    if not number:
+        return None
+    return number, _get_feature(ms.mfl.transits, 'depot', True)
+
+
+def get_error_values(ms: ModelState, dv):
+    # Values of the base type radio and additional types checklist of a DV for a model state
+    error_funcs = ms.error_funcs.get(dv, [])
+    base = next((func for func in error_funcs if func in ('add', 'prop', 'comb')), None)
+    return base, [func for func in error_funcs if func != base]
+
+
+def _get_feature(features, attr, default):
+    return getattr(features.features[0], attr) if features.features else default
+
+
+def _cached_render(key, render):
+    code = _render_cache.get(key)
+    if code is None:
+        code = render()
+        _render_cache.put(key, code)
+    return code
+
+
+def _model_key(model):
+    # NOTE: The dataset is left out since hashing it is expensive and only its datainfo ends up
+    # in the model code. Name and description are not part of model equality. The components
+    # themselves are the key, so that a hash collision is resolved by comparing them.
     return (
-        _render_model_code(model),
-        generate_code(funcs, 'python'),
-        generate_code(funcs, 'r'),
+        type(model),
+        model.name,
+        model.description,
+        model.parameters,
+        model.random_variables,
+        model.statements,
+        model.dependent_variables,
+        model.observation_transformation,
+        model.execution_steps,
+        model.datainfo,
     )
 
 
 def _render_model_code(model):
-    if type(model) != Model:
-        return get_model_code(model)
+    if type(model) != pharmpy_model.Model:
+        return modeling.get_model_code(model)
     else:
         text_renderer = _render_generic_model(model)
         return text_renderer
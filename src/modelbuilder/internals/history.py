@@ -0,0 +1,36 @@
+class History:
+    # Model states before (undo) and after (redo) the current state of a session, at most maxsize
+    # of each. Model states are immutable and share unchanged fields, so a snapshot costs little
+    # more than the field that was changed.
+    def __init__(self, maxsize=50):
+        self.maxsize = maxsize
+        self.undo_states = []
+        self.redo_states = []
+
+    def record(self, state):
+        # A new change, the states that were undone can no longer be redone
+        self.undo_states.append(state)
+        del self.undo_states[: -self.maxsize]
+        self.redo_states.clear()
+
+    def undo(self, current):
+        if not self.undo_states:
+            return None
+        self.redo_states.append(current)
+        del self.redo_states[: -self.maxsize]
+        return self.undo_states.pop()
+
+    def redo(self, current):
+        if not self.redo_states:
+            return None
+        self.undo_states.append(current)
+        del self.undo_states[: -self.maxsize]
+        return self.redo_states.pop()
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_states)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_states)
@@ -0,0 +1,105 @@
+import os
+import pickle
+from importlib import metadata
+
+from .cache import atomic_write, get_cache_dir
+
+
+class ModelCache:
+    # Generated models and rendered code on disk, keyed by model state fingerprint. Entries are
+    # kept in a directory per version of pharmpy and modelbuilder, so an upgrade never reads
+    # models generated by another version. The directory can be shared between processes. When
+    # the entries take more than max_size bytes the least recently used are removed, down to
+    # low_water of max_size so that pruning is rare.
+    def __init__(self, path=None, max_size=1024 * 1024 * 1024, low_water=0.8):
+        self.path = get_cache_dir(path, 'models') / _get_versions_key()
+        self.path.mkdir(mode=0o700, exist_ok=True)
+        self.max_size = max_size
+        self.low_water = low_water
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def get(self, fingerprint, name):
+        entry_path = self._entry_path(fingerprint, name)
+        try:
+            with open(entry_path, 'rb') as f:
+                value = pickle.load(f)
+            # The modification time is the last use when pruning
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # A truncated or outdated entry is a miss, and is removed so that it is written again
+            try:
+                entry_path.unlink()
+            except FileNotFoundError:
+                pass
+            return None
+        return value
+
+    def put(self, fingerprint, name, value):
+        # A full disk or a value that cannot be pickled only means that it is not cached
+        try:
+            with atomic_write(self._entry_path(fingerprint, name)) as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            return False
+        self._size += size
+        if self._size > self.max_size:
+            self.prune()
+        return True
+
+    def prune(self):
+        # The size is counted again since other processes also add entries
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        if size <= self.max_size:
+            self._size = size
+            return
+        for _, entry_size, entry_path in entries:
+            if size <= self.max_size * self.low_water:
+                break
+            try:
+                entry_path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
+
+    def __contains__(self, key):
+        fingerprint, name = key
+        return self._entry_path(fingerprint, name).exists()
+
+    def _entries(self):
+        for entry_path in self.path.glob('*.pickle'):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, entry_path
+
+    def _entry_path(self, fingerprint, name):
+        return self.path / f'{fingerprint}-{name}.pickle'
+
+
+def _get_versions_key():
+    import pharmpy
+
+    try:
+        version = metadata.version('pharmpy-modelbuilder')
+    except metadata.PackageNotFoundError:
+        version = 'dev'
+    return f'modelbuilder-{version}-pharmpy-{pharmpy.__version__}'
+
+
+def _create_model_cache():
+    # Optional, enabled with MODELBUILDER_MODEL_CACHE=1. On by default with background callbacks,
+    # since the caches in memory of a background job are lost when it ends.
+    default = os.environ.get('MODELBUILDER_BACKGROUND_CALLBACKS', '0')
+    if os.environ.get('MODELBUILDER_MODEL_CACHE', default) != '1':
+        return None
+    max_size = int(os.environ.get('MODELBUILDER_MODEL_CACHE_SIZE', 1024)) * 1024 * 1024
+    return ModelCache(os.environ.get('MODELBUILDER_MODEL_CACHE_DIR'), max_size=max_size)
+
+
+model_cache = _create_model_cache()
@@ -1,64 +1,87 @@
+from __future__ import annotations
+
 import ast
 import builtins
+import hashlib
 from dataclasses import dataclass
-from functools import partial
-
-import pandas as pd
-import pharmpy
-from pharmpy.internals.immutable import Immutable
-from pharmpy.mfl import ModelFeatures
-from pharmpy.model import Parameter, Parameters
-from pharmpy.modeling import (
-    add_iov,
-    convert_model,
-    create_basic_pk_model,
-    fix_parameters,
-    get_individual_parameters,
-    get_rv_parameters,
-    has_additive_error_model,
-    has_combined_error_model,
-    has_proportional_error_model,
-    set_additive_error_model,
-    set_combined_error_model,
-    set_dataset,
-    set_description,
-    set_iiv_on_ruv,
-    set_initial_estimates,
-    set_lower_bounds,
-    set_name,
-    set_power_on_ruv,
-    set_proportional_error_model,
-    set_time_varying_error_model,
-    set_upper_bounds,
-    unfix_parameters,
-)
-from pharmpy.modeling.mfl import generate_transformations, get_model_features
-
-from pywrapr.docs_conversion import translate_python_row
-
-ERROR_FUNCS = {
-    'add': set_additive_error_model,
-    'prop': set_proportional_error_model,
-    'comb': set_combined_error_model,
-    'iiv-on-ruv': set_iiv_on_ruv,
-    'power': set_power_on_ruv,
-    'time-varying': partial(set_time_varying_error_model, cutoff=1.0),
-}
-ERROR_FUNCS_DICT = {
-    set_proportional_error_model: has_proportional_error_model,
-    set_additive_error_model: has_additive_error_model,
-    set_combined_error_model: has_combined_error_model,
-}
-
-
-@dataclass
-class ModelState(Immutable):
+from functools import cache, partial
+
+from pharmpy.internals.module.lazy import LazyImport
+
+from .cache import IdentityKey, LRUCache
+from .dataset import DatasetHandle, read_dataset
+from .model_cache import model_cache
+from .profiling import profiler
+
+# pharmpy.model and pharmpy.modeling take seconds to import, so they (and pandas, pharmpy.mfl and
+# pywrapr) are imported on first use to keep the startup of the app fast
+pd = LazyImport('pd', globals(), 'pandas')
+pharmpy_mfl = LazyImport('pharmpy_mfl', globals(), 'pharmpy.mfl')
+pharmpy_model = LazyImport('pharmpy_model', globals(), 'pharmpy.model')
+modeling = LazyImport('modeling', globals(), 'pharmpy.modeling')
+modeling_mfl = LazyImport('modeling_mfl', globals(), 'pharmpy.modeling.mfl')
+docs_conversion = LazyImport('docs_conversion', globals(), 'pywrapr.docs_conversion')
+
+
+@cache
+def _get_error_funcs():
+    error_funcs = {
+        'add': modeling.set_additive_error_model,
+        'prop': modeling.set_proportional_error_model,
+        'comb': modeling.set_combined_error_model,
+        'iiv-on-ruv': modeling.set_iiv_on_ruv,
+        'power': modeling.set_power_on_ruv,
+        'time-varying': partial(modeling.set_time_varying_error_model, cutoff=1.0),
+    }
+    has_error_funcs = {
+        modeling.set_proportional_error_model: modeling.has_proportional_error_model,
+        modeling.set_additive_error_model: modeling.has_additive_error_model,
+        modeling.set_combined_error_model: modeling.has_combined_error_model,
+    }
+    return error_funcs, has_error_funcs
+
+
+# NONMEM data items that are not typed in the datainfo but are needed by the model
+DATA_ITEM_COLUMNS = ('CMT', 'PCMT', 'ADDL')
+
+# Output of each pipeline stage in ModelState.list_functions, keyed by the stage keys up to it
+_stage_cache = LRUCache(maxsize=512)
+# Output of the whole pipeline, keyed by model state fingerprint. Going back to an earlier state
+# (e.g. undo) then does not have to look up each stage.
+_state_cache = LRUCache(maxsize=256)
+# Datasets as attached to a model (with the derived datainfo), keyed by dataset
+_dataset_cache = LRUCache(maxsize=8)
+# Datainfo of all columns of a dataset and the columns that are attached, keyed by dataset
+_datainfo_cache = LRUCache(maxsize=8)
+# Content hashes of datasets given as DataFrames, keyed by dataset
+_dataset_hashes = LRUCache(maxsize=8)
+
+
+@dataclass(frozen=True, eq=False, init=False)
+class ModelState:
+    # Immutable, a change gives a new state with replace() (or update_model_state), which shares
+    # all fields that are not replaced. States can thus be shared between sessions and threads.
+    __slots__ = (
+        'model_type',
+        'model_format',
+        'model_attrs',
+        'mfl',
+        'error_funcs',
+        'parameters',
+        'iov',
+        'col',
+        'individual_parameters',
+        'dataset',
+        '_fingerprint',
+    )
+
     model_type: str
     model_format: str
     model_attrs: dict
-    mfl: ModelFeatures
+    mfl: pharmpy_mfl.ModelFeatures
     error_funcs: list[str]
-    parameters: Parameters
+    parameters: pharmpy_model.Parameters
+    iov: list
     col: list
     individual_parameters: list
     dataset: pd.DataFrame
@@ -76,50 +99,115 @@ class ModelState(Immutable):
         individual_parameters=None,
         dataset=None,
     ):
-        self.model_type = model_type
-        self.model_format = model_format
-        self.model_attrs = model_attrs
-        self.mfl = mfl
-        self.error_funcs = error_funcs
-        self.parameters = parameters
-        self.iov = iov
-        self.col = col
-        self.individual_parameters = individual_parameters
-        self.dataset = dataset
+        _set = object.__setattr__
+        _set(self, 'model_type', model_type)
+        _set(self, 'model_format', model_format)
+        _set(self, 'model_attrs', model_attrs)
+        _set(self, 'mfl', mfl)
+        _set(self, 'error_funcs', error_funcs)
+        _set(self, 'parameters', parameters)
+        _set(self, 'iov', iov)
+        _set(self, 'col', col)
+        _set(self, 'individual_parameters', individual_parameters)
+        _set(self, 'dataset', dataset)
+        _set(self, '_fingerprint', None)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, _):
+        return self
+
+    def __reduce__(self):
+        # NOTE: Frozen, so unpickling has to go through __init__ (the fingerprint is not pickled)
+        return ModelState, tuple(getattr(self, field) for field in _FIELDS)
+
+    @property
+    def fingerprint(self):
+        # Hash of all fields in a canonical form, computed once per instance. It is the same for
+        # equal states in all processes, so it can also be used as a key outside of the process.
+        if self._fingerprint is None:
+            key = repr(self._canonical_key()).encode('utf-8')
+            object.__setattr__(self, '_fingerprint', hashlib.sha256(key).hexdigest())
+        return self._fingerprint
+
+    def _canonical_key(self):
+        return (
+            self.model_type,
+            self.model_format,
+            tuple(sorted((key, repr(value)) for key, value in self.model_attrs.items())),
+            repr(self.mfl),
+            _error_funcs_key(self.error_funcs),
+            tuple((p.name, p.init, p.lower, p.upper, p.fix) for p in self.parameters),
+            _iov_key(self.iov),
+            tuple(self.col) if self.col is not None else None,
+            (tuple(self.individual_parameters) if self.individual_parameters is not None else None),
+            _dataset_key(self.dataset),
+        )
 
     def replace(self, **kwargs):
-        model_format = kwargs.get('model_format', self.model_format)
-        mfl = kwargs.get('mfl', self.mfl)
-        model_attrs = kwargs.get('model_attrs', self.model_attrs)
-        error_funcs = kwargs.get('error_funcs', self.error_funcs)
-        parameters = kwargs.get('parameters', self.parameters)
-        iov = kwargs.get('iov', self.iov)
-        col = kwargs.get('col', self.col)
-        individual_parameters = kwargs.get('individual_parameters', self.individual_parameters)
-        dataset = kwargs.get('dataset', self.dataset)
-
-        return ModelState(
-            model_type=self.model_type,
-            model_format=model_format,
-            model_attrs=model_attrs,
-            mfl=mfl,
-            error_funcs=error_funcs,
-            parameters=parameters,
-            iov=iov,
-            col=col,
-            individual_parameters=individual_parameters,
-            dataset=dataset,
+        unknown = kwargs.keys() - set(_FIELDS)
+        if unknown:
+            raise TypeError(f'Unknown fields: {", ".join(sorted(unknown))}')
+        if all(getattr(self, field) is value for field, value in kwargs.items()):
+            return self
+        # Fields that are not replaced are shared with this state
+        return ModelState(*(kwargs.get(field, getattr(self, field)) for field in _FIELDS))
+
+    def to_dict(self):
+        # JSON serializable, e.g. for pharmpy-modelbuilder build. A dataset in the dataset store
+        # is kept as its handle, a dataset file can be given by its path in from_dict.
+        if isinstance(self.dataset, pd.DataFrame):
+            raise TypeError('A model state with a DataFrame as dataset cannot be serialized')
+        return {
+            'model_type': self.model_type,
+            'model_format': self.model_format,
+            'model_attrs': dict(self.model_attrs),
+            'mfl': repr(self.mfl),
+            'error_funcs': {str(dv): list(funcs) for dv, funcs in self.error_funcs.items()},
+            'parameters': [param.to_dict() for param in self.parameters],
+            'iov': [dict(rv) for rv in self.iov] if self.iov is not None else None,
+            'col': list(self.col) if self.col is not None else None,
+            'individual_parameters': (
+                list(self.individual_parameters) if self.individual_parameters is not None else None
+            ),
+            'dataset': (
+                {'id': self.dataset.id, 'name': self.dataset.name}
+                if self.dataset is not None
+                else None
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        dataset = d.get('dataset')
+        if isinstance(dataset, dict):
+            dataset = DatasetHandle(dataset['id'], dataset['name'])
+        elif dataset is not None:
+            dataset = read_dataset(dataset)
+        params = [pharmpy_model.Parameter.from_dict(param) for param in d['parameters']]
+        return cls(
+            d['model_type'],
+            d['model_format'],
+            dict(d.get('model_attrs', {})),
+            pharmpy_mfl.ModelFeatures.create(d['mfl']),
+            {int(dv): list(funcs) for dv, funcs in d['error_funcs'].items()},
+            pharmpy_model.Parameters.create(params),
+            d.get('iov', []),
+            d.get('col'),
+            d.get('individual_parameters'),
+            dataset,
         )
 
     @classmethod
     def create(cls, model_type):
         model = cls._create_base_model(model_type)
-        mfl = get_model_features(model)
+        mfl = modeling_mfl.get_model_features(model)
         error_funcs = {1: ['prop']}
         parameters = model.parameters
         col = model.datainfo.names
         iov = []
-        individual_parameters = get_individual_parameters(model)
+        individual_parameters = modeling.get_individual_parameters(model)
         dataset = None
         return cls(
             model_type,
@@ -136,80 +224,213 @@ class ModelState(Immutable):
 
     @staticmethod
     def _create_base_model(model_type, dataset=None, datainfo=None):
-        model = create_basic_pk_model(model_type)
+        model = modeling.create_basic_pk_model(model_type)
         if dataset is not None and datainfo:
             model = model.replace(dataset=dataset, datainfo=datainfo)
         return model
 
     def list_functions(self, dataset=None, datainfo=None):
+        funcs, model, _ = self._list_functions(dataset, datainfo)
+        return funcs, model
+
+    def sync_with_model(self, dataset=None, datainfo=None):
+        # State with the parameters and individual parameters of the generated model, e.g. after
+        # a structural change that adds or removes parameters
+        funcs, model, updates = self._list_functions(dataset, datainfo)
+        ms = self.replace(**updates)
+        if ms is not self and dataset is None and datainfo is None:
+            # NOTE: The parameters are those of the model, so the synced state generates the same
+            # model and shares the result instead of running the pipeline again
+            _state_cache.put(ms.fingerprint, (funcs, model, {}))
+        return ms
+
+    def _list_functions(self, dataset, datainfo):
+        if dataset is not None or datainfo is not None:
+            with profiler.timed('list_functions', 'pipeline'):
+                return self._run_stages(dataset, datainfo)
+        result = _state_cache.get(self.fingerprint)
+        if result is None and model_cache is not None:
+            result = model_cache.get(self.fingerprint, 'model')
+        if result is None:
+            with profiler.timed('list_functions', 'pipeline'):
+                result = self._run_stages(dataset, datainfo)
+            # NOTE: Models with a dataset are not written to disk since the data would be copied
+            # into each entry
+            if model_cache is not None and self.dataset is None:
+                model_cache.put(self.fingerprint, 'model', result)
+        _state_cache.put(self.fingerprint, result)
+        return result
+
+    def _run_stages(self, dataset, datainfo):
+        # Each stage is cached on the keys of all stages up to and including itself, so a change
+        # in e.g. the covariates only reruns the covariate, parameter and format stages
         funcs = []
+        model = None
+        key = ()
+        updates = {}
+        for name, stage_key, stage in self._get_stages(dataset, datainfo):
+            key += ((name, stage_key),)
+            result = _stage_cache.get(key)
+            if result is None:
+                with profiler.timed(name, 'stage'):
+                    result = stage(model)
+                _stage_cache.put(key, result)
+            stage_funcs, model, stage_updates = result
+            funcs.extend(stage_funcs)
+            updates.update(stage_updates)
+
+        return funcs, model, updates
+
+    def _get_stages(self, dataset, datainfo):
+        is_pd_model = self._is_pd_model()
+        return [
+            (
+                'base',
+                (self.model_type, _object_key(dataset), datainfo, _object_key(self.dataset)),
+                partial(self._base_stage, dataset=dataset, datainfo=datainfo),
+            ),
+            (
+                'attrs',
+                (self.model_attrs.get('name'), self.model_attrs.get('description')),
+                self._attrs_stage,
+            ),
+            (
+                'structural',
+                (
+                    repr(self.mfl.filter(filter_on='pk')),
+                    repr(self._get_pd_features()),
+                    self.model_format if is_pd_model else None,
+                ),
+                partial(self._structural_stage, is_pd_model=is_pd_model),
+            ),
+            (
+                'error',
+                tuple((dv, tuple(func_names)) for dv, func_names in self.error_funcs.items()),
+                self._error_stage,
+            ),
+            (
+                'variability',
+                (repr(self.mfl.iiv), repr(self.mfl.covariance)),
+                self._variability_stage,
+            ),
+            ('iov', _iov_key(self.iov), self._iov_stage),
+            ('covariates', repr(self.mfl.covariates), self._covariate_stage),
+            ('parameters', self.parameters, self._parameter_stage),
+            (
+                'format',
+                self.model_format if not is_pd_model else None,
+                partial(self._format_stage, is_pd_model=is_pd_model),
+            ),
+        ]
 
-        funcs.append(partial(create_basic_pk_model, administration=self.model_type))
-        model = funcs[-1]()
+    def _base_stage(self, _, dataset, datainfo):
+        funcs = []
+
+        funcs.append(partial(modeling.create_basic_pk_model, administration=self.model_type))
+        model = _apply(funcs[-1])
 
         # FIXME: How to handle datainfo?
         if dataset is not None and datainfo is not None:
-            funcs.append(partial(pharmpy.model.Model.replace, dataset=dataset, datainfo=datainfo))
-            model = funcs[-1](model)
+            funcs.append(partial(pharmpy_model.Model.replace, dataset=dataset, datainfo=datainfo))
+            model = _apply(funcs[-1], model)
         elif self.dataset is not None:
             # FIXME: datatype has to be nonmem, if it is generic there will be an error
-            funcs.append(partial(set_dataset, path_or_df=self.dataset, datatype='nonmem'))
-            model = funcs[-1](model)
+            dataset, datainfo = _get_attached_dataset(self.dataset)
+            funcs.append(partial(modeling.set_dataset, path_or_df=dataset, datatype='nonmem'))
+            model = model.replace(dataset=dataset, datainfo=datainfo)
+
+        return funcs, model, {}
+
+    def _attrs_stage(self, model):
+        funcs = []
 
         if self.model_attrs:
             attrs = self.model_attrs.copy()
             if 'name' in attrs:
-                funcs.append(partial(set_name, new_name=attrs['name']))
-                model = funcs[-1](model)
+                funcs.append(partial(modeling.set_name, new_name=attrs['name']))
+                model = _apply(funcs[-1], model)
             if 'description' in attrs:
-                funcs.append(partial(set_description, new_description=attrs['description']))
-                model = funcs[-1](model)
+                funcs.append(
+                    partial(modeling.set_description, new_description=attrs['description'])
+                )
+                model = _apply(funcs[-1], model)
+
+        return funcs, model, {}
+
+    def _structural_stage(self, model, is_pd_model):
+        funcs = []
 
         mfl_funcs = self._get_mfl_funcs(model)
-        is_pd_model = self._is_pd_model()
 
         if is_pd_model and self.model_format != "generic":
-            funcs.append(partial(convert_model, to_format=self.model_format))
-            model = funcs[-1](model)
+            funcs.append(partial(modeling.convert_model, to_format=self.model_format))
+            model = _apply(funcs[-1], model)
 
         for func in mfl_funcs:
             funcs.append(func)
-            model = funcs[-1](model)
+            model = _apply(funcs[-1], model)
+
+        return funcs, model, {}
+
+    def _error_stage(self, model):
+        funcs = []
+        error_funcs, has_error_funcs = _get_error_funcs()
 
         for dv, func_names in self.error_funcs.items():
             for func_name in func_names:
-                if ERROR_FUNCS[func_name] not in ERROR_FUNCS_DICT.keys() or not ERROR_FUNCS_DICT[
-                    ERROR_FUNCS[func_name]
-                ](model, dv=dv):
-                    funcs.append(partial(ERROR_FUNCS[func_name], dv=dv))
-                    model = funcs[-1](model)
+                func = error_funcs[func_name]
+                if func not in has_error_funcs.keys() or not has_error_funcs[func](model, dv=dv):
+                    funcs.append(partial(func, dv=dv))
+                    model = _apply(funcs[-1], model)
+
+        return funcs, model, {}
+
+    def _variability_stage(self, model):
+        funcs = []
 
         variability_funcs = self._get_mfl_funcs_variability(model)
         for func in variability_funcs:
             funcs.append(func)
-            model = funcs[-1](model)
+            model = _apply(funcs[-1], model)
+
+        return funcs, model, {}
+
+    def _iov_stage(self, model):
+        funcs = []
 
         if self.iov:
             for rv in self.iov:
-                if isinstance(rv['list_of_parameters'], str):
-                    rv['list_of_parameters'] = ast.literal_eval(rv['list_of_parameters'])
-                funcs.append(partial(add_iov, **rv))
-                model = funcs[-1](model)
+                rv = dict(rv, list_of_parameters=_parse_parameter_list(rv['list_of_parameters']))
+                funcs.append(partial(modeling.add_iov, **rv))
+                model = _apply(funcs[-1], model)
+
+        return funcs, model, {}
+
+    def _covariate_stage(self, model):
+        funcs = []
 
         if self.mfl.covariates:
-            covariate_funcs = generate_transformations(self.mfl.covariates, include_remove=False)
+            covariate_funcs = modeling_mfl.generate_transformations(
+                self.mfl.covariates, include_remove=False
+            )
             for func in covariate_funcs:
                 funcs.append(func)
-                model = funcs[-1](model)
+                model = _apply(funcs[-1], model)
+
+        return funcs, model, {}
+
+    def _parameter_stage(self, model):
+        funcs = []
+        updates = {}
 
         #  Update parameters when model parameters have changed
-        if self.parameters != model.parameters:
-            self.parameters, self.individual_parameters = _update_parameters_from_model(
-                self.parameters, model
-            )
+        parameters = self.parameters
+        if parameters != model.parameters:
+            parameters, individual_parameters = _update_parameters_from_model(parameters, model)
+            updates = {'parameters': parameters, 'individual_parameters': individual_parameters}
         parameter_transformations = {'inits': {}, 'lower': {}, 'upper': {}, 'fix': [], 'unfix': []}
         for p in model.parameters:
-            param = self.parameters[p.name]
+            param = parameters[p.name]
             if param != p:
                 if param.init != p.init:
                     parameter_transformations['inits'][param.name] = param.init
@@ -220,35 +441,46 @@ class ModelState(Immutable):
                     (parameter_transformations['fix' if param.fix else 'unfix']).append(param.name)
 
         func_mapping = {
-            'inits': (set_initial_estimates, 'inits'),
-            'lower': (set_lower_bounds, 'bounds'),
-            'upper': (set_upper_bounds, 'bounds'),
-            'fix': (fix_parameters, 'parameter_names'),
-            'unfix': (unfix_parameters, 'parameter_names'),
+            'inits': (modeling.set_initial_estimates, 'inits'),
+            'lower': (modeling.set_lower_bounds, 'bounds'),
+            'upper': (modeling.set_upper_bounds, 'bounds'),
+            'fix': (modeling.fix_parameters, 'parameter_names'),
+            'unfix': (modeling.unfix_parameters, 'parameter_names'),
         }
         for attr, values in parameter_transformations.items():
             if values:
                 func_name = func_mapping[attr]
                 func = partial(func_name[0], **{func_name[1]: values})
                 funcs.append(func)
-                model = func(model)
+                model = _apply(func, model)
+
+        return funcs, model, updates
+
+    def _format_stage(self, model, is_pd_model):
+        funcs = []
 
         if not is_pd_model and self.model_format != "generic":
-            funcs.append(partial(convert_model, to_format=self.model_format))
-            model = funcs[-1](model)
+            funcs.append(partial(modeling.convert_model, to_format=self.model_format))
+            model = _apply(funcs[-1], model)
 
-        return funcs, model
+        return funcs, model, {}
 
     def generate_model(self, dataset=None, datainfo=None):
         funcs, model = self.list_functions(dataset, datainfo)
         return model
 
+    def get_attached_dataset(self):
+        # The dataset and datainfo of the generated model, without generating it
+        if self.dataset is None:
+            return None, None
+        return _get_attached_dataset(self.dataset)
+
     def _get_mfl_funcs(self, model_base):
         # FIXME: assumes base model is PK, should detect PD as well
-        mfl_start = get_model_features(model_base, type='pk')
+        mfl_start = modeling_mfl.get_model_features(model_base, type='pk')
         mfl_diff = self.mfl.filter(filter_on='pk') - mfl_start
         mfl_structural = mfl_diff + self._get_pd_features()
-        return generate_transformations(mfl_structural)
+        return modeling_mfl.generate_transformations(mfl_structural)
 
     def _is_pd_model(self):
         return len(self._get_pd_features()) > 0
@@ -262,7 +494,7 @@ class ModelState(Immutable):
         def _filter_iiv(iivs, params):
             return [iiv for iiv in iivs if iiv.parameter in params]
 
-        iivs_start = get_model_features(model_base, type='iiv')
+        iivs_start = modeling_mfl.get_model_features(model_base, type='iiv')
 
         to_remove = _filter_iiv(iivs_start - self.mfl.iiv, potential_params)
         to_add = _filter_iiv(self.mfl.iiv - iivs_start, potential_params)
@@ -272,33 +504,33 @@ class ModelState(Immutable):
         def _filter_cov(covs, params):
             return [cov for cov in covs if set(cov.parameters).issubset(params)]
 
-        covs_start = get_model_features(model_base, type='covariance')
+        covs_start = modeling_mfl.get_model_features(model_base, type='covariance')
         if self.mfl.covariance - covs_start:
             to_add += _filter_cov(self.mfl.covariance, potential_params)
         to_remove += _filter_cov(covs_start - self.mfl.covariance, potential_params)
         variability_funcs = []
 
         if to_remove:
-            variability_funcs += generate_transformations(
+            variability_funcs += modeling_mfl.generate_transformations(
                 to_remove, include_remove=True, include_add=False
             )
         if to_add:
-            variability_funcs += generate_transformations(
+            variability_funcs += modeling_mfl.generate_transformations(
                 to_add, include_remove=False, include_add=True
             )
 
         return variability_funcs
 
     def __eq__(self, other):
-        return (
-            self.model_type == other.model_type
-            and self.model_format == other.model_format
-            and self.model_attrs == other.model_attrs
-            and self.mfl == other.mfl
-            and self.error_funcs == other.error_funcs
-            and self.parameters == other.parameters
-            and self.iov == other.iov
-        )
+        if not isinstance(other, ModelState):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+
+_FIELDS = tuple(field for field in ModelState.__slots__ if not field.startswith('_'))
 
 
 def update_model_state(ms_old, mfl=None, type=None, **kwargs):
@@ -307,20 +539,30 @@ def update_model_state(ms_old, mfl=None, type=None, **kwargs):
     parameters = kwargs.get('parameters')
     iov = kwargs.get('iov')
     individual_parameters = kwargs.get('individual_parameters')
-    if not parameters:
-        ms_old = ms_old.replace(parameters=Parameters())
     if mfl is not None:
-        mfl_parsed = ModelFeatures.create(mfl)
+        mfl_parsed = pharmpy_mfl.ModelFeatures.create(mfl)
         mfl_new = _update_mfl(ms_old.mfl, mfl_parsed, type)
+        # NOTE: An unchanged model (e.g. a control set to the state after undo) keeps its
+        # parameters
+        if repr(mfl_new) == repr(ms_old.mfl):
+            return ms_old
+    if model_attrs and model_attrs == ms_old.model_attrs:
+        return ms_old
+    if error is not None:
+        error_funcs = _interpret_error_model(error, ms_old.error_funcs)
+        if error_funcs == ms_old.error_funcs:
+            return ms_old
+    if not parameters:
+        ms_old = ms_old.replace(parameters=pharmpy_model.Parameters())
+    if mfl is not None:
         return ms_old.replace(mfl=mfl_new)
     if model_attrs:
         return ms_old.replace(model_attrs=model_attrs)
     if error is not None:
-        error_funcs = _interpret_error_model(error, ms_old.error_funcs)
         return ms_old.replace(error_funcs=error_funcs)
     if parameters:
-        params_new = [Parameter.from_dict(d) for d in parameters]
-        return ms_old.replace(parameters=Parameters.create(params_new))
+        params_new = [pharmpy_model.Parameter.from_dict(d) for d in parameters]
+        return ms_old.replace(parameters=pharmpy_model.Parameters.create(params_new))
     if iov is not None:
         return ms_old.replace(iov=iov)
     if individual_parameters:
@@ -347,7 +589,7 @@ def _update_mfl(mfl_old, mfl_parsed, type):
     else:
         raise NotImplementedError
 
-    mfl_new = ModelFeatures.create(mfl_old - features_old + features_new)
+    mfl_new = pharmpy_mfl.ModelFeatures.create(mfl_old - features_old + features_new)
     return mfl_new
 
 
@@ -366,7 +608,7 @@ def _interpret_error_model(error_funcs, error_old):
         base_err = base_error.get(dv)
         if error_func in mutex:
             if base_err:
-                error_addons = error_old[dv].copy().remove(base_error[dv])
+                error_addons = [func for func in error_old[dv] if func != base_err]
             else:
                 error_addons = []
             if error_addons:
@@ -387,7 +629,7 @@ def _interpret_error_model(error_funcs, error_old):
 
 
 def _update_parameters_from_model(ms_parameters, model):
-    new_params = Parameters()
+    new_params = pharmpy_model.Parameters()
     for param in ms_parameters:
         if param.name in model.parameters.names:
             new_params += param
@@ -395,18 +637,136 @@ def _update_parameters_from_model(ms_parameters, model):
         if param.name not in ms_parameters.names:
             new_params += param
 
-    individual_parameters = get_individual_parameters(model)
+    individual_parameters = modeling.get_individual_parameters(model)
     return new_params, individual_parameters
 
 
+def _apply(func, *args):
+    with profiler.timed(_get_func_name(func), 'function'):
+        return func(*args)
+
+
+def _get_func_name(func):
+    if isinstance(func, partial):
+        return func.func.__name__
+    return func.__name__
+
+
+def get_datainfo(dataset):
+    # Datainfo of all columns of a dataset (handle or DataFrame) as derived when attached to a
+    # model
+    datainfo, _ = _get_dataset_info(dataset)
+    return datainfo
+
+
+def get_dataset_columns(dataset):
+    # The columns of a dataset that are attached to the model: the typed columns in the datainfo,
+    # the untyped NONMEM data items and the numeric columns, which are the candidate covariates
+    # and occasions. E.g. text columns are not loaded.
+    _, columns = _get_dataset_info(dataset)
+    return columns
+
+
+def _get_dataset_info(dataset):
+    key = _object_key(dataset)
+    info = _datainfo_cache.get(key)
+    if info is None:
+        df, datainfo = _attach_dataset(dataset, None)
+        columns = tuple(
+            column.name
+            for column in datainfo
+            if column.type != 'unknown'
+            or column.name in DATA_ITEM_COLUMNS
+            or pd.api.types.is_numeric_dtype(df[column.name])
+        )
+        info = (datainfo, columns)
+        _datainfo_cache.put(key, info)
+    return info
+
+
+def _get_attached_dataset(dataset):
+    # Attaching validates the dataset and derives the datainfo from it, which only has to be done
+    # once per dataset. A new upload is a new handle (or DataFrame) and thus a new key.
+    key = _object_key(dataset)
+    attached = _dataset_cache.get(key)
+    if attached is None:
+        attached = _attach_dataset(dataset, get_dataset_columns(dataset))
+        _dataset_cache.put(key, attached)
+    return attached
+
+
+def _attach_dataset(dataset, columns):
+    with profiler.timed('attach_dataset', 'dataset'):
+        if isinstance(dataset, DatasetHandle):
+            # NOTE: Only the columns are copied out of a memory mapped dataset
+            dataset = dataset.load(columns=columns)
+        elif columns is not None:
+            dataset = dataset[list(columns)]
+        model = modeling.create_basic_pk_model('iv')
+        model = _apply(partial(modeling.set_dataset, path_or_df=dataset, datatype='nonmem'), model)
+    return model.dataset, model.datainfo
+
+
+def _object_key(obj):
+    if obj is None or isinstance(obj, DatasetHandle):
+        return obj
+    return IdentityKey(obj)
+
+
+def _error_funcs_key(error_funcs):
+    if isinstance(error_funcs, dict):
+        return tuple(sorted((dv, tuple(func_names)) for dv, func_names in error_funcs.items()))
+    return tuple(error_funcs)
+
+
+def _dataset_key(dataset):
+    if dataset is None:
+        return None
+    if isinstance(dataset, DatasetHandle):
+        # The id is the hash of the content
+        return dataset.id
+    key = IdentityKey(dataset)
+    dataset_hash = _dataset_hashes.get(key)
+    if dataset_hash is None:
+        digest = hashlib.sha256(repr(list(dataset.dtypes.items())).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(dataset).to_numpy().tobytes())
+        dataset_hash = digest.hexdigest()
+        _dataset_hashes.put(key, dataset_hash)
+    return dataset_hash
+
+
+def _iov_key(iov):
+    if not iov:
+        return ()
+    # NOTE: Parameter lists can be either lists or strings of lists (from the data table)
+    return tuple(
+        tuple(
+            (key, str(_parse_parameter_list(value) if key == 'list_of_parameters' else value))
+            for key, value in rv.items()
+        )
+        for rv in iov
+    )
+
+
+def _parse_parameter_list(value):
+    if isinstance(value, str):
+        return ast.literal_eval(value)
+    return value
+
+
 def _update_covariates(model, covariates):
     new_covariates = [
-        cov for cov in covariates if cov.parameter in get_individual_parameters(model)
+        cov for cov in covariates if cov.parameter in modeling.get_individual_parameters(model)
     ]
-    return ModelFeatures.create(new_covariates)
+    return pharmpy_mfl.ModelFeatures.create(new_covariates)
 
 
 def generate_code(funcs, language):
+    with profiler.timed(language, 'generate_code'):
+        return _generate_code(funcs, language)
+
+
+def _generate_code(funcs, language):
     string_out = ''
     for i, func in enumerate(funcs):
         if isinstance(func, partial):
@@ -419,11 +779,11 @@ def generate_code(funcs, language):
                 args = 'model, ' + args
             func_call = f"{func_name}({args})"
             if language == 'r':
-                func_call = translate_python_row(func_call)
+                func_call = docs_conversion.translate_python_row(func_call)
         else:
             func_call = f"{func.__name__}(model)"
             if language == 'r':
-                func_call = translate_python_row(func_call)
+                func_call = docs_conversion.translate_python_row(func_call)
         if language == 'python':
             string_out += f"model = {func_call}\n"
         else:
@@ -455,7 +815,7 @@ def _get_params_with_iiv(model):
     params_with_iiv = {}
     for rv in model.random_variables.iiv.names:
         try:
-            param = get_rv_parameters(model, rv)[0]
+            param = modeling.get_rv_parameters(model, rv)[0]
         except ValueError:
             continue
         else:
@@ -0,0 +1,58 @@
+import itertools
+
+from .help_functions import CODE_VIEWS, render_model_view
+from .model_state import ModelState, update_model_state
+
+ROUTES = ('iv', 'oral')
+MODEL_FORMATS = ('nonmem', 'generic', 'nlmixr', 'rxode')
+
+# Options of the Structural tab, see design/structural.py
+ABSORPTION = ('FO', 'ZO', 'SEQ-ZO-FO')
+ELIMINATION = ('FO', 'MM', 'MIX-FO-MM', 'ZO')
+PERIPHERALS = (0, 1, 2)
+ABSORPTION_DELAY = ('LAGTIME(OFF);TRANSITS(0)', 'LAGTIME(ON);TRANSITS(0)')
+
+
+def get_grid_states(routes=ROUTES, model_formats=MODEL_FORMATS):
+    # Model states as created by the callbacks: a new model for the route (change_route and
+    # change_model_type) followed by the structural options (which reset the parameters)
+    for route, model_format in itertools.product(routes, model_formats):
+        ms_base = ModelState.create(route)
+        if model_format != ms_base.model_format:
+            ms_base = ms_base.replace(model_format=model_format)
+        yield ms_base
+
+        if route == 'iv':
+            options = itertools.product(ELIMINATION, PERIPHERALS)
+            mfls = (f'ELIMINATION({elim});PERIPHERALS({n})' for elim, n in options)
+        else:
+            options = itertools.product(ABSORPTION, ELIMINATION, PERIPHERALS, ABSORPTION_DELAY)
+            mfls = (
+                f'ABSORPTION({abs_rate});ELIMINATION({elim});PERIPHERALS({n});{abs_delay}'
+                for abs_rate, elim, n, abs_delay in options
+            )
+        for mfl in mfls:
+            ms = update_model_state(ms_base, mfl, type='structural')
+            # NOTE: The default options give the new model itself
+            if ms is not ms_base:
+                yield ms
+
+
+def precompute(model_cache, routes=ROUTES, model_formats=MODEL_FORMATS, progress=None):
+    # Generates and renders the grid of model states into the model cache, states that are
+    # already in the cache are skipped. Returns the number of states that failed.
+    states = list(get_grid_states(routes, model_formats))
+    failed = 0
+    for i, ms in enumerate(states, start=1):
+        names = ('model',) + CODE_VIEWS
+        if not all((ms.fingerprint, name) in model_cache for name in names):
+            try:
+                model_cache.put(ms.fingerprint, 'model', ms._list_functions(None, None))
+                for view in CODE_VIEWS:
+                    model_cache.put(ms.fingerprint, view, render_model_view(ms, view))
+            except Exception:
+                # NOTE: Not all combinations can be converted to all formats
+                failed += 1
+        if progress is not None:
+            progress(i, len(states))
+    return failed
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Profiler:
+    # Records wall time per named step, e.g. each function appended in ModelState.list_functions.
+    # Only the last max_events events are kept for the trace, the per-step statistics are kept
+    # for all events.
+    def __init__(self, enabled=False, max_events=10000):
+        self.enabled = enabled
+        self._events = deque(maxlen=max_events)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def timed(self, name, category):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.perf_counter())
+
+    def record(self, name, category, start, end):
+        with self._lock:
+            self._events.append((name, category, start, end, threading.get_ident()))
+            count, total, longest = self._stats.get((category, name), (0, 0.0, 0.0))
+            duration = end - start
+            self._stats[(category, name)] = (count + 1, total + duration, max(longest, duration))
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+            self._stats.clear()
+
+    def stats(self):
+        with self._lock:
+            items = list(self._stats.items())
+        rows = [
+            {
+                'category': category,
+                'name': name,
+                'count': count,
+                'total': total,
+                'mean': total / count,
+                'max': longest,
+            }
+            for (category, name), (count, total, longest) in items
+        ]
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+    def to_json(self):
+        return json.dumps({'stats': self.stats()}, indent=2)
+
+    def to_chrome_trace(self):
+        # See the Trace Event Format, complete events ("X") with timestamps in microseconds
+        with self._lock:
+            events = list(self._events)
+        pid = os.getpid()
+        trace_events = [
+            {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - self._start) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': pid,
+                'tid': tid,
+            }
+            for name, category, start, end, tid in events
+        ]
+        return json.dumps({'traceEvents': trace_events, 'displayTimeUnit': 'ms'})
+
+
+profiler = Profiler(enabled=os.environ.get('MODELBUILDER_PROFILE') == '1')
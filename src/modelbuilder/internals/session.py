@@ -0,0 +1,128 @@
+import pickle
+import uuid
+
+from .cache import LRUCache, atomic_write, check_id, get_cache_dir, prune_expired
+from .history import History
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class MemoryBackend:
+    # Sessions of a single process, the least recently used are dropped when full
+    def __init__(self, maxsize=256):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def load(self, session_id):
+        return self._cache.get(session_id)
+
+    def save(self, session_id, value):
+        self._cache.put(session_id, value)
+
+
+class DiskBackend:
+    # Sessions pickled to a directory, which can be shared between processes (e.g. the workers
+    # of a WSGI server). Sessions that have not been saved for max_age seconds are removed.
+    def __init__(self, path=None, max_age=24 * 60 * 60):
+        self.path = get_cache_dir(path, 'sessions')
+        self.max_age = max_age
+
+    def load(self, session_id):
+        try:
+            with open(self._session_path(session_id), 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save(self, session_id, value):
+        session_path = self._session_path(session_id)
+        if not session_path.exists():
+            self.prune()
+        with atomic_write(session_path) as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def prune(self):
+        prune_expired(self.path.glob('*.pickle'), self.max_age)
+
+    def _session_path(self, session_id):
+        return self.path / f'{session_id}.pickle'
+
+
+BACKENDS = {'memory': MemoryBackend, 'disk': DiskBackend}
+
+
+def create_backend(name, **kwargs):
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f'Unknown session backend: {name} (available: {", ".join(BACKENDS)})')
+    return backend(**kwargs)
+
+
+class SessionStore:
+    # Values with a fingerprint (e.g. ModelState) are only saved when they differ from what was
+    # last loaded or saved for the session in this process. With history_size, the replaced
+    # values are kept in a History per session (saved in the same backend) for undo and redo.
+    def __init__(self, backend, factory, maxsize=256, history_size=0):
+        self.backend = backend
+        self.factory = factory
+        self.history_size = history_size
+        self._fingerprints = LRUCache(maxsize=maxsize)
+
+    def get(self, session_id):
+        check_id(session_id, 32, 'session')
+        value = self.backend.load(session_id)
+        if value is None:
+            value = self.factory()
+        self._fingerprints.put(session_id, getattr(value, 'fingerprint', None))
+        return value
+
+    def commit(self, session_id, value):
+        check_id(session_id, 32, 'session')
+        fingerprint = getattr(value, 'fingerprint', None)
+        if fingerprint is not None and self._fingerprints.get(session_id) == fingerprint:
+            return
+        if self.history_size:
+            previous = self.backend.load(session_id)
+            if previous is not None and previous != value:
+                history = self.history(session_id)
+                history.record(previous)
+                self.backend.save(_history_key(session_id), history)
+        self._save(session_id, value)
+
+    def reset(self, session_id, value):
+        # A new model, the history of the previous one is dropped
+        check_id(session_id, 32, 'session')
+        if self.history_size:
+            self.backend.save(_history_key(session_id), History(maxsize=self.history_size))
+        self._save(session_id, value)
+
+    def history(self, session_id):
+        check_id(session_id, 32, 'session')
+        history = self.backend.load(_history_key(session_id))
+        if history is None:
+            history = History(maxsize=self.history_size)
+        return history
+
+    def undo(self, session_id):
+        return self._step(session_id, History.undo)
+
+    def redo(self, session_id):
+        return self._step(session_id, History.redo)
+
+    def _step(self, session_id, step):
+        history = self.history(session_id)
+        value = step(history, self.get(session_id))
+        if value is not None:
+            self.backend.save(_history_key(session_id), history)
+            self._save(session_id, value)
+        return value
+
+    def _save(self, session_id, value):
+        self.backend.save(session_id, value)
+        self._fingerprints.put(session_id, getattr(value, 'fingerprint', None))
+
+
+def _history_key(session_id):
+    return f'{session_id}-history'
@@ -0,0 +1,25 @@
+from flask import jsonify, request
+
+from modelbuilder.internals.dataset import DatasetTooLargeError, dataset_store
+
+# Relative to the pathname prefix of the app, see assets/upload.js
+UPLOAD_DATASET_ROUTE = '_modelbuilder/datasets'
+
+
+def register_routes(app):
+    # Datasets are uploaded as is to this endpoint instead of as base64 through the callbacks, the
+    # returned id is what the browser passes on to the callbacks. The size of a request is limited
+    # to the largest dataset (MODELBUILDER_MAX_UPLOAD_MB), which is also checked while storing it
+    # in case the request has no content length.
+    app.server.config['MAX_CONTENT_LENGTH'] = dataset_store.max_upload_size
+
+    @app.server.route(app.config.routes_pathname_prefix + UPLOAD_DATASET_ROUTE, methods=['POST'])
+    def upload_dataset():
+        try:
+            dataset_id = dataset_store.add(request.stream)
+        except DatasetTooLargeError as e:
+            return jsonify({'error': str(e)}), 413
+        filename = request.args.get('filename', 'dataset')
+        return jsonify({'id': dataset_id, 'filename': filename})
+
+    return
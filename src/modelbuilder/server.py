@@ -0,0 +1,85 @@
+import os
+import sys
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8050
+
+
+def default_workers():
+    # Model generation is CPU bound so there is little use in more workers than cores
+    return os.cpu_count() or 1
+
+
+def serve(
+    host=DEFAULT_HOST,
+    port=DEFAULT_PORT,
+    workers=None,
+    threads=4,
+    preload=True,
+    keep_alive=5,
+    timeout=120,
+    background=False,
+):
+    if workers is None:
+        workers = default_workers()
+
+    # NOTE: Has to be set before the app is imported since the session store and compression
+    # are configured at import
+    os.environ.setdefault('MODELBUILDER_COMPRESS', '1')
+    if background:
+        os.environ.setdefault('MODELBUILDER_BACKGROUND_CALLBACKS', '1')
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        _serve_waitress(host, port, threads)
+        return
+
+    if workers > 1:
+        os.environ.setdefault('MODELBUILDER_SESSION_BACKEND', 'disk')
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'preload_app': preload,
+        'keepalive': keep_alive,
+        'timeout': timeout,
+        # Started in each worker, threads do not survive the fork of a preloaded app
+        'post_worker_init': _start_warm_up,
+    }
+
+    class _Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from modelbuilder.app import server
+
+            return server
+
+    _Application().run()
+
+
+def _start_warm_up(worker=None):
+    from modelbuilder import config
+
+    config.start_warm_up()
+
+
+def _serve_waitress(host, port, threads):
+    # gunicorn is not available on Windows, waitress only supports threads
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        sys.exit(
+            'A WSGI server is needed to serve the app, install it with: '
+            'pip install "pharmpy-modelbuilder[serve]"'
+        )
+
+    from modelbuilder.app import server
+
+    _start_warm_up()
+    waitress_serve(server, host=host, port=port, threads=threads)
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from pharmpy.modeling import load_example_model
+
+from modelbuilder.internals.batch import export_variants, get_variants, parse_grid
+from modelbuilder.internals.model_state import ModelState, update_model_state
+
+
+def test_parse_grid():
+    grid = parse_grid('PERIPHERALS(0..2); ELIMINATION([FO,MM]);ERROR(add, prop, comb)')
+    assert grid == [
+        ('PERIPHERALS', ['0', '1', '2']),
+        ('ELIMINATION', ['FO', 'MM']),
+        ('ERROR', ['add', 'prop', 'comb']),
+    ]
+    with pytest.raises(ValueError):
+        parse_grid('PERIPHERALS(0')
+    with pytest.raises(ValueError):
+        parse_grid('PERIPHERALS()')
+
+
+def test_get_variants():
+    model_state = ModelState.create('iv')
+    variants = get_variants(model_state, 'PERIPHERALS(0..2);ELIMINATION([FO,MM]);ERROR(add,prop)')
+    assert len(variants) == 12
+    name, options, ms = variants[-1]
+    assert name == 'model_2_MM_prop'
+    assert options == {'PERIPHERALS': '2', 'ELIMINATION': 'MM', 'ERROR': 'prop'}
+    assert 'PERIPHERALS(2)' in repr(ms.mfl)
+    assert ms.error_funcs == {1: ['prop']}
+    assert len({ms.fingerprint for _, _, ms in variants}) == 12
+
+
+def test_get_variants_error_addons():
+    model_state = update_model_state(ModelState.create('iv'), error={1: 'iiv-on-ruv'})
+    model_state = model_state.replace(error_funcs={**model_state.error_funcs, 2: ['add', 'power']})
+    variants = get_variants(model_state, 'ERROR(add,comb)')
+    assert [ms.error_funcs for _, _, ms in variants] == [
+        {1: ['add', 'iiv-on-ruv'], 2: ['add', 'power']},
+        {1: ['comb', 'iiv-on-ruv'], 2: ['add', 'power']},
+    ]
+
+
+def test_export_variants(tmp_path):
+    dataset = load_example_model('pheno').dataset
+    model_state = ModelState.create('iv').replace(dataset=dataset)
+    progress = []
+    manifest = export_variants(
+        model_state,
+        'PERIPHERALS(0,1);ERROR(add,prop)',
+        tmp_path,
+        model_formats=['nonmem', 'nlmixr'],
+        max_workers=1,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+    assert progress == [(1, 2), (2, 2)]
+    assert json.loads((tmp_path / 'manifest.json').read_text()) == manifest
+    assert manifest['dataset'] == 'model.csv'
+    assert [variant['name'] for variant in manifest['variants']] == [
+        'model_0_add',
+        'model_0_prop',
+        'model_1_add',
+        'model_1_prop',
+    ]
+    for variant in manifest['variants']:
+        assert not variant['errors']
+        assert sorted(variant['models']) == ['nlmixr', 'nonmem']
+        for model_path in variant['models'].values():
+            assert (tmp_path / model_path).exists()
+    model_code = (tmp_path / 'nonmem' / 'model_1_prop.ctl').read_text()
+    assert '$DATA ../model.csv' in model_code
@@ -0,0 +1,29 @@
+import json
+
+from pharmpy.modeling import load_example_model
+
+from modelbuilder.internals.build import build, load_model_state
+from modelbuilder.internals.model_state import ModelState
+
+
+def test_build(tmp_path):
+    load_example_model('pheno').dataset.to_csv(tmp_path / 'pheno.csv', index=False)
+    d = ModelState.create('oral').to_dict()
+    d['dataset'] = 'pheno.csv'
+    (tmp_path / 'state.json').write_text(json.dumps(d))
+
+    model_state = load_model_state(tmp_path / 'state.json')
+    files = build(model_state, tmp_path / 'out', model_format='nlmixr')
+    assert [path.name for path in files] == [
+        'start.csv',
+        'start.R',
+        'start_pharmpy.py',
+        'start_pharmr.R',
+    ]
+    python_code = files[2].read_text()
+    assert 'from pharmpy.modeling import *' in python_code
+    assert "path_or_df=Path(__file__).parent / 'start.csv'" in python_code
+    assert "to_format='nlmixr'" in python_code
+    r_code = files[3].read_text()
+    assert "path_or_df='start.csv'" in r_code
+    assert '# Run in the directory of this script' in r_code
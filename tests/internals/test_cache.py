@@ -0,0 +1,41 @@
+import os
+import time
+
+import pytest
+
+from modelbuilder.internals.cache import atomic_write, check_id, prune_expired
+
+
+def test_atomic_write(tmp_path):
+    path = tmp_path / 'a.txt'
+    with atomic_write(path, 'w') as f:
+        f.write('a')
+    assert path.read_text() == 'a'
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(path, 'w') as f:
+            f.write('b')
+            raise RuntimeError
+    assert path.read_text() == 'a'
+    assert list(tmp_path.iterdir()) == [path]
+
+    # The path is given once the file is written
+    with atomic_write(lambda: tmp_path / 'b.txt', 'w', dir=tmp_path) as f:
+        f.write('b')
+    assert (tmp_path / 'b.txt').read_text() == 'b'
+
+
+def test_prune_expired(tmp_path):
+    old, new = tmp_path / 'old', tmp_path / 'new'
+    old.touch()
+    new.touch()
+    os.utime(old, (time.time() - 100, time.time() - 100))
+    prune_expired(tmp_path.iterdir(), 50)
+    assert list(tmp_path.iterdir()) == [new]
+
+
+@pytest.mark.parametrize('value', ['0' * 31, 'g' * 32, '../' + '0' * 29, None])
+def test_check_id(value):
+    check_id('0' * 32, 32, 'session')
+    with pytest.raises(ValueError, match='Invalid session id'):
+        check_id(value, 32, 'session')
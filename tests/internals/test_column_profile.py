@@ -0,0 +1,69 @@
+import pandas as pd
+from pharmpy.modeling import load_example_model
+
+from modelbuilder.internals.column_profile import (
+    get_column_profiles,
+    profile_columns,
+    rank_covariates,
+)
+
+
+def test_get_column_profiles():
+    dataset = load_example_model('pheno').dataset
+    profiles = get_column_profiles(dataset)
+    assert list(profiles) == list(dataset.columns)
+    assert get_column_profiles(dataset) is profiles
+
+    assert profiles['ID'].type == 'id'
+    assert not profiles['ID'].is_covariate
+    assert profiles['WGT'].is_covariate
+    assert profiles['WGT'].constant_within_id
+    assert profiles['WGT'].min == dataset['WGT'].min()
+    assert profiles['WGT'].cardinality == dataset['WGT'].nunique()
+    assert profiles['TIME'].varies_within_id
+
+
+def test_profile_columns():
+    df = pd.DataFrame(
+        {
+            'ID': [1, 2, 1, 2, 1, 2],
+            'OCC': [1, 1, 2, 2, 3, 3],
+            'SEX': [0, 1, 0, 1, 0, 1],
+            'RACE': ['a', '.', 'a', '.', 'a', '.'],
+            'CRCL': [50.0, None, 55.0, None, 60.0, None],
+        }
+    )
+    types = {'ID': 'id', 'OCC': 'unknown', 'SEX': 'unknown', 'RACE': 'unknown', 'CRCL': 'unknown'}
+    profiles = profile_columns(df, types)
+    assert profiles['OCC'].is_occasion
+    assert profiles['OCC'].cardinality == 3
+    assert profiles['SEX'].constant_within_id
+    assert profiles['SEX'].cardinality == 2
+    assert not profiles['SEX'].is_occasion
+    assert profiles['RACE'].constant_within_id
+    assert profiles['RACE'].missing == 3
+    assert not profiles['RACE'].numeric
+    assert profiles['CRCL'].varies_within_id
+    assert profiles['CRCL'].missing == 3
+    assert (profiles['CRCL'].min, profiles['CRCL'].max) == (50.0, 60.0)
+
+
+def test_rank_covariates():
+    df = pd.DataFrame(
+        {
+            'ID': [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6],
+            'AMT': [100, 0] * 6,
+            'DV': [0, 1.0, 0, 2.0, 0, 3.0, 0, 4.0, 0, 5.0, 0, 6.0],
+            'WGT': [50.5, 50.5, 61.0, 61.0, 69.5, 69.5, 80.0, 80.0, 85.0, 85.0, 92.5, 92.5],
+            'AGE': [40, 40, 25, 25, 33, 33, 30, 30, 52, 52, 29, 29],
+            'SEX': [0, 0, 1, 1, 0, 0, 1, 1, 0, 0, 1, 1],
+            'OCC': [1, 2] * 6,
+        }
+    )
+    types = {'ID': 'id', 'AMT': 'dose', 'DV': 'dv'}
+    profiles = profile_columns(df, types)
+    assert profiles['WGT'].dv_correlation > 0.99
+    assert profiles['OCC'].dv_correlation is None
+    ranked = rank_covariates(profiles)
+    assert [p.name for p in ranked] == ['WGT', 'SEX', 'AGE', 'OCC']
+    assert [p.suggested_effect for p in ranked] == ['pow', 'cat', 'pow', 'cat']
@@ -0,0 +1,115 @@
+import io
+from functools import partial
+
+import pandas as pd
+import pytest
+from pharmpy.modeling import load_example_model
+
+from modelbuilder.internals import dataset
+from modelbuilder.internals.dataset import (
+    DatasetExpiredError,
+    DatasetStore,
+    DatasetTooLargeError,
+    get_read_options,
+    read_dataset,
+)
+
+
+@pytest.fixture(scope='module')
+def pheno():
+    df = load_example_model('pheno').dataset
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+
+def _to_bytes(df, sep):
+    lines = [sep.join(df.columns)]
+    lines += [sep.join(str(value) for value in row) for row in df.itertuples(index=False)]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _write(tmp_path, df, sep):
+    path = tmp_path / 'dataset.csv'
+    path.write_bytes(_to_bytes(df, sep))
+    return path
+
+
+@pytest.mark.parametrize('sep', [',', ', ', ' ', '  ', '\t'])
+def test_read_dataset(tmp_path, pheno, sep):
+    progress = []
+    df = read_dataset(_write(tmp_path, pheno, sep), chunksize=50, progress=progress.append)
+    pd.testing.assert_frame_equal(df, pheno)
+    assert len(progress) == -(-len(pheno) // 50)
+    assert progress == sorted(progress)
+    assert progress[-1] == 1.0
+
+
+def test_read_dataset_types_change(tmp_path, pheno, monkeypatch):
+    # Missing values after the sample, so the sampled type of DV cannot be used
+    monkeypatch.setattr(dataset, 'SAMPLE_SIZE', 1024)
+    df = pheno.astype({'DV': object})
+    df.loc[len(df) - 1, 'DV'] = '.'
+    df = read_dataset(_write(tmp_path, df, ','), chunksize=50)
+    assert df['DV'].iloc[-1] == '.'
+    assert df['DV'].iloc[0] == str(pheno['DV'].iloc[0])
+    assert len(df) == len(pheno)
+    assert df.drop(columns='DV').dtypes.equals(pheno.drop(columns='DV').dtypes)
+
+
+def test_get_read_options():
+    assert get_read_options(b'ID,TIME,DV\n1,0,0\n')['sep'] == ','
+    assert get_read_options(b'ID TIME DV\n1 0 0\n')['sep'] == r'\s+'
+
+
+def test_dataset_store(tmp_path, pheno):
+    store = DatasetStore(tmp_path)
+    data = _to_bytes(pheno, ',')
+    dataset_id = store.add(io.BytesIO(data))
+    assert store.add(io.BytesIO(data)) == dataset_id
+    assert len(list(tmp_path.glob('*.dataset'))) == 1
+
+    pd.testing.assert_frame_equal(store.load(dataset_id), pheno)
+    pd.testing.assert_frame_equal(store.load(dataset_id, columns=['ID', 'DV']), pheno[['ID', 'DV']])
+
+    with pytest.raises(ValueError):
+        store.load('../dataset')
+
+
+def test_dataset_store_limits(tmp_path, pheno):
+    data = _to_bytes(pheno, ',')
+    store = DatasetStore(tmp_path, max_upload_size=len(data) - 1)
+    with pytest.raises(DatasetTooLargeError):
+        store.add(io.BytesIO(data))
+    assert list(tmp_path.iterdir()) == []
+
+    store = DatasetStore(tmp_path, max_age=-1)
+    dataset_id = store.add(io.BytesIO(data))
+    store.prune()
+    with pytest.raises(DatasetExpiredError):
+        store.load(dataset_id)
+
+
+def test_dataset_store_arrow(tmp_path, pheno):
+    pytest.importorskip('pyarrow')
+    store = DatasetStore(tmp_path)
+    dataset_id = store.add(io.BytesIO(_to_bytes(pheno, ',')))
+    store.load(dataset_id)
+    assert (tmp_path / f'{dataset_id}.arrow').exists()
+
+    # A new store, e.g. in another process, maps the Arrow file instead of parsing the dataset
+    (tmp_path / f'{dataset_id}.dataset').write_bytes(b'')
+    pd.testing.assert_frame_equal(DatasetStore(tmp_path).load(dataset_id), pheno)
+
+
+def test_dataset_store_arrow_types_change(tmp_path, pheno, monkeypatch):
+    # A NONMEM missing value after the sample, the column has the same type in all chunks
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(dataset, 'SAMPLE_SIZE', 1024)
+    monkeypatch.setattr(dataset, 'read_dataset', partial(read_dataset, chunksize=50))
+    df = pheno.astype({'WGT': object})
+    df.loc[len(df) - 1, 'WGT'] = '.'
+    store = DatasetStore(tmp_path)
+    dataset_id = store.add(io.BytesIO(_to_bytes(df, ',')))
+    df = store.load(dataset_id)
+    assert (tmp_path / f'{dataset_id}.arrow').exists()
+    assert df['WGT'].iloc[-1] == '.'
+    assert len(df) == len(pheno)
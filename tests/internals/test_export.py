@@ -0,0 +1,80 @@
+import os
+import time
+import zipfile
+
+import pandas as pd
+import pytest
+from pharmpy.modeling import load_example_model
+
+from modelbuilder.internals.build import load_model_state
+from modelbuilder.internals.export import ExportQueue, write_model_files
+from modelbuilder.internals.model_state import ModelState
+
+
+@pytest.fixture(scope='module')
+def model_state():
+    dataset = load_example_model('pheno').dataset
+    return ModelState.create('iv').replace(dataset=dataset)
+
+
+def test_write_model_files(tmp_path, model_state):
+    model = model_state.generate_model()
+    progress = []
+    model_path, dataset_path = write_model_files(
+        model, tmp_path, chunksize=50, progress=progress.append
+    )
+    assert model_path.name == f'{model.name}.ctl'
+    assert f'$DATA {model.name}.csv' in model_path.read_text()
+    df = pd.read_csv(dataset_path)
+    assert list(df.columns) == list(model.dataset.columns)
+    assert len(df) == len(model.dataset)
+    assert len(progress) == -(-len(model.dataset) // 50)
+    assert progress[-1] == 1.0
+
+
+def test_export_queue(tmp_path, model_state):
+    queue = ExportQueue(tmp_path / 'exports')
+    job_id, future = queue.submit(model_state, target=tmp_path / 'models' / 'run1.ctl')
+    future.result()
+    status = queue.status(job_id)
+    assert status['state'] == 'done'
+    with zipfile.ZipFile(queue.archive_path(job_id)) as archive:
+        assert sorted(archive.namelist()) == ['run1.csv', 'run1.ctl', 'state.json']
+    assert sorted(path.name for path in (tmp_path / 'models').iterdir()) == [
+        'run1.csv',
+        'run1.ctl',
+        'state.json',
+    ]
+    # The model can be built again from the saved files
+    model_state_saved = load_model_state(tmp_path / 'models' / 'state.json')
+    assert model_state_saved.mfl == model_state.mfl
+    assert len(model_state_saved.generate_model().dataset) == len(model_state.dataset)
+
+
+def test_export_queue_failed(tmp_path):
+    queue = ExportQueue(tmp_path)
+    # No dataset to write
+    job_id, future = queue.submit(ModelState.create('iv'))
+    assert future.exception() is not None
+    assert queue.status(job_id)['state'] == 'failed'
+    assert queue.archive_path(job_id) is None
+    with pytest.raises(ValueError):
+        queue.status('../datasets')
+
+
+def test_export_queue_stale(tmp_path):
+    queue = ExportQueue(tmp_path, heartbeat=0.05)
+    job_id, future = queue.submit(ModelState.create('iv'))
+    future.exception()
+    # As a job of a worker process that has stopped
+    queue._set_status(job_id, 'running', 'Generating model')
+    assert queue.status(job_id)['state'] == 'running'
+    status_path = tmp_path / job_id / 'status.json'
+    os.utime(status_path, (time.time() - 1, time.time() - 1))
+    assert queue.status(job_id)['state'] == 'failed'
+
+    # The heartbeat keeps a job that is still running alive
+    queue._jobs.add(job_id)
+    os.utime(status_path, (time.time() - 1, time.time() - 1))
+    time.sleep(0.2)
+    assert queue.status(job_id)['state'] == 'running'
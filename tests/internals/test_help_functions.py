@@ -0,0 +1,63 @@
+import pytest
+
+from modelbuilder.internals.help_functions import (
+    _model_key,
+    _render_cache,
+    _view_cache,
+    render_model_code,
+    render_model_view,
+)
+from modelbuilder.internals.model_state import ModelState, update_model_state
+
+
+def test_render_model_code_cached():
+    _render_cache.clear()
+    _view_cache.clear()
+    model_state = ModelState.create('iv')
+    model_code, python_code, r_code = render_model_code(model_state)
+    assert '$PROBLEM' in model_code
+    assert python_code.startswith('model = create_basic_pk_model')
+    assert len(_render_cache) == 2
+
+    model_state_format = model_state.replace(model_format='nonmem')
+    assert render_model_code(model_state_format) == (model_code, python_code, r_code)
+    assert len(_render_cache) == 2
+
+    model_state_new = update_model_state(model_state, model_attrs={'description': 'new'})
+    model_code_new, _, _ = render_model_code(model_state_new)
+    assert model_code_new != model_code
+    assert len(_render_cache) == 4
+
+
+def test_render_model_view():
+    _render_cache.clear()
+    _view_cache.clear()
+    model_state = ModelState.create('oral')
+    python_code = render_model_view(model_state, 'output-python')
+    assert 'administration=\'oral\'' in python_code
+    assert len(_render_cache) == 0
+    r_code = render_model_view(model_state, 'output-r')
+    assert r_code.startswith('model <- create_basic_pk_model')
+    assert len(_render_cache) == 1
+    with pytest.raises(ValueError):
+        render_model_view(model_state, 'output-julia')
+
+
+def test_render_model_view_by_state():
+    _view_cache.clear()
+    model_state = ModelState.create('oral')
+    model_code = render_model_view(model_state, 'output-model')
+    _render_cache.clear()
+    # An equal state, e.g. after undo, is not rendered again
+    assert render_model_view(ModelState.create('oral'), 'output-model') is model_code
+    assert len(_render_cache) == 0
+
+
+def test_model_key_compares_components():
+    model = ModelState.create('iv').generate_model()
+    model_new = update_model_state(
+        ModelState.create('iv'), 'PERIPHERALS(1)', type='structural'
+    ).generate_model()
+    assert _model_key(model) == _model_key(model)
+    assert _model_key(model) != _model_key(model_new)
+    assert model.statements in _model_key(model)
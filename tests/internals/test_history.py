@@ -0,0 +1,20 @@
+from modelbuilder.internals.history import History
+
+
+def test_history():
+    history = History(maxsize=2)
+    assert history.undo('a') is None
+    for state in ['a', 'b', 'c']:
+        history.record(state)
+    assert history.undo_states == ['b', 'c']
+
+    assert history.undo('d') == 'c'
+    assert history.undo('c') == 'b'
+    assert not history.can_undo
+    assert history.redo('b') == 'c'
+    assert history.redo('c') == 'd'
+    assert history.redo('d') is None
+
+    history.undo('d')
+    history.record('e')
+    assert not history.can_redo
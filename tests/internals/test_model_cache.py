@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from modelbuilder.internals import help_functions, model_state
+from modelbuilder.internals.model_cache import ModelCache, _create_model_cache
+from modelbuilder.internals.model_state import (
+    ModelState,
+    _stage_cache,
+    _state_cache,
+    update_model_state,
+)
+from modelbuilder.internals.precompute import get_grid_states, precompute
+
+
+def test_model_cache(tmp_path):
+    model_cache = ModelCache(tmp_path)
+    assert model_cache.path.parent == tmp_path
+    assert 'pharmpy' in model_cache.path.name
+    fingerprint = ModelState.create('iv').fingerprint
+    assert model_cache.get(fingerprint, 'output-model') is None
+    model_cache.put(fingerprint, 'output-model', '$PROBLEM')
+    assert (fingerprint, 'output-model') in model_cache
+    assert ModelCache(tmp_path).get(fingerprint, 'output-model') == '$PROBLEM'
+
+
+def test_model_cache_default_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    model_cache = ModelCache()
+    assert model_cache.path.parent == tmp_path / 'pharmpy-modelbuilder' / 'models'
+    assert (tmp_path / 'pharmpy-modelbuilder').stat().st_mode & 0o777 == 0o700
+    assert model_cache.path.stat().st_mode & 0o777 == 0o700
+
+    # Pickled entries are not loaded from a directory of another user
+    monkeypatch.setattr(os, 'getuid', lambda: os.stat(tmp_path).st_uid + 1)
+    with pytest.raises(PermissionError):
+        ModelCache()
+
+
+def test_model_cache_background(tmp_path, monkeypatch):
+    monkeypatch.setenv('MODELBUILDER_MODEL_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('MODELBUILDER_MODEL_CACHE', raising=False)
+    monkeypatch.delenv('MODELBUILDER_BACKGROUND_CALLBACKS', raising=False)
+    assert _create_model_cache() is None
+    # Background jobs lose their caches in memory
+    monkeypatch.setenv('MODELBUILDER_BACKGROUND_CALLBACKS', '1')
+    assert _create_model_cache() is not None
+    monkeypatch.setenv('MODELBUILDER_MODEL_CACHE', '0')
+    assert _create_model_cache() is None
+
+
+def test_get_grid_states():
+    states = list(get_grid_states(routes=['iv', 'oral'], model_formats=['nonmem']))
+    # The default options are the new models
+    assert len(states) == 2 + (4 * 3 - 1) + (3 * 4 * 3 * 2 - 1)
+    assert len(set(states)) == len(states)
+
+
+def test_precompute(tmp_path, monkeypatch):
+    model_cache = ModelCache(tmp_path)
+    assert precompute(model_cache, routes=['iv'], model_formats=['nonmem']) == 0
+
+    monkeypatch.setattr(model_state, 'model_cache', model_cache)
+    monkeypatch.setattr(help_functions, 'model_cache', model_cache)
+    _stage_cache.clear()
+    _state_cache.clear()
+    help_functions._view_cache.clear()
+
+    # As after change_route and a click on MM elimination
+    ms = update_model_state(ModelState.create('iv'), 'ELIMINATION(MM)', type='structural')
+    ms = update_model_state(ms, 'PERIPHERALS(0)', type='structural')
+    assert 'MM' in help_functions.render_model_view(ms, 'output-python')
+    assert ms.generate_model() is not None
+    assert len(_stage_cache) == 0
+
+
+def test_model_cache_eviction(tmp_path):
+    model_cache = ModelCache(tmp_path, max_size=3000)
+    for i in range(5):
+        assert model_cache.put(f'{i:064x}', 'output-model', 'x' * 1000)
+    assert model_cache.get(f'{0:064x}', 'output-model') is None
+    assert model_cache.get(f'{4:064x}', 'output-model') == 'x' * 1000
+    assert sum(1 for _ in model_cache._entries()) == 2
+    assert not model_cache.put(f'{5:064x}', 'output-model', lambda: None)
+
+    # Pruned down to the low water mark, a put below max_size does not prune
+    model_cache = ModelCache(tmp_path / 'low', max_size=5000, low_water=0.5)
+    for i in range(5):
+        model_cache.put(f'{i:064x}', 'output-model', 'x' * 1000)
+    assert sum(1 for _ in model_cache._entries()) == 2
+    model_cache.put(f'{5:064x}', 'output-model', 'x' * 1000)
+    assert sum(1 for _ in model_cache._entries()) == 3
+
+
+def test_model_cache_broken_entry(tmp_path):
+    model_cache = ModelCache(tmp_path)
+    fingerprint = ModelState.create('iv').fingerprint
+    model_cache.put(fingerprint, 'model', ModelState.create('iv'))
+    entry_path = model_cache._entry_path(fingerprint, 'model')
+    # E.g. pickled with a class that no longer exists
+    entry_path.write_bytes(entry_path.read_bytes().replace(b'ModelState', b'ModelStatX'))
+    assert model_cache.get(fingerprint, 'model') is None
+    assert not entry_path.exists()
+
+
+def test_model_cache_across_restarts(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_state, 'model_cache', ModelCache(tmp_path))
+    ms = update_model_state(ModelState.create('oral'), 'PERIPHERALS(2)', type='structural')
+    _state_cache.clear()
+    funcs, model = ms.list_functions()
+
+    # As a new process with empty caches in memory
+    monkeypatch.setattr(model_state, 'model_cache', ModelCache(tmp_path))
+    _stage_cache.clear()
+    _state_cache.clear()
+    funcs_cached, model_cached = ms.list_functions()
+    assert len(_stage_cache) == 0
+    assert model_cached == model
+    assert len(funcs_cached) == len(funcs)
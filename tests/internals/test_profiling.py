@@ -0,0 +1,30 @@
+import json
+
+from modelbuilder.internals.profiling import Profiler
+
+
+def test_profiler():
+    profiler = Profiler(enabled=True, max_events=2)
+    for name in ['a', 'b', 'a']:
+        with profiler.timed(name, 'stage'):
+            pass
+    stats = {row['name']: row for row in profiler.stats()}
+    assert stats['a']['count'] == 2
+    assert stats['b']['count'] == 1
+    assert stats['a']['category'] == 'stage'
+    assert stats['a']['mean'] == stats['a']['total'] / 2
+
+    trace = json.loads(profiler.to_chrome_trace())
+    assert [event['name'] for event in trace['traceEvents']] == ['b', 'a']
+    assert all(event['ph'] == 'X' for event in trace['traceEvents'])
+    assert json.loads(profiler.to_json())['stats'] == profiler.stats()
+
+    profiler.reset()
+    assert profiler.stats() == []
+
+
+def test_profiler_disabled():
+    profiler = Profiler()
+    with profiler.timed('a', 'stage'):
+        pass
+    assert profiler.stats() == []
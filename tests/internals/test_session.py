@@ -0,0 +1,93 @@
+import pytest
+
+from modelbuilder.internals.session import (
+    DiskBackend,
+    MemoryBackend,
+    SessionStore,
+    create_backend,
+    new_session_id,
+)
+
+
+@pytest.mark.parametrize('backend', ['memory', 'disk'])
+def test_session_store(tmp_path, backend):
+    kwargs = {'path': tmp_path} if backend == 'disk' else {}
+    store = SessionStore(create_backend(backend, **kwargs), dict)
+    session1, session2 = new_session_id(), new_session_id()
+    assert store.get(session1) == {}
+    store.commit(session1, {'model_type': 'oral'})
+    assert store.get(session1) == {'model_type': 'oral'}
+    assert store.get(session2) == {}
+
+    with pytest.raises(ValueError):
+        store.get('../session')
+
+
+def test_memory_backend_lru():
+    backend = MemoryBackend(maxsize=2)
+    for i, session_id in enumerate(['a', 'b', 'c']):
+        backend.save(session_id, i)
+    assert backend.load('a') is None
+    assert backend.load('c') == 2
+
+
+def test_disk_backend_shared(tmp_path):
+    backend1, backend2 = DiskBackend(tmp_path), DiskBackend(tmp_path)
+    session_id = new_session_id()
+    backend1.save(session_id, [1, 2])
+    assert backend2.load(session_id) == [1, 2]
+
+    backend_expired = DiskBackend(tmp_path, max_age=-1)
+    backend_expired.prune()
+    assert backend2.load(session_id) is None
+
+
+def test_create_backend():
+    with pytest.raises(ValueError):
+        create_backend('redis')
+
+
+def test_session_store_skips_unchanged():
+    class Value:
+        def __init__(self, fingerprint):
+            self.fingerprint = fingerprint
+
+    saved = []
+    backend = MemoryBackend()
+    backend_save = backend.save
+    backend.save = lambda session_id, value: (saved.append(value), backend_save(session_id, value))
+    store = SessionStore(backend, lambda: Value('a'))
+    session_id = new_session_id()
+    store.commit(session_id, store.get(session_id))
+    assert saved == []
+    store.commit(session_id, Value('b'))
+    store.commit(session_id, Value('b'))
+    assert [value.fingerprint for value in saved] == ['b']
+
+
+@pytest.mark.parametrize('backend', ['memory', 'disk'])
+def test_session_store_undo_redo(tmp_path, backend):
+    kwargs = {'path': tmp_path} if backend == 'disk' else {}
+    store = SessionStore(create_backend(backend, **kwargs), dict, history_size=2)
+    session_id = new_session_id()
+    assert store.undo(session_id) is None
+    for i in range(4):
+        store.commit(session_id, {'i': i})
+    assert store.history(session_id).can_undo
+
+    assert store.undo(session_id) == {'i': 2}
+    assert store.undo(session_id) == {'i': 1}
+    assert store.undo(session_id) is None
+    assert store.get(session_id) == {'i': 1}
+    assert store.redo(session_id) == {'i': 2}
+    assert store.get(session_id) == {'i': 2}
+
+    # A new change after undo drops the states that could be redone
+    store.commit(session_id, {'i': 5})
+    assert not store.history(session_id).can_redo
+    assert store.undo(session_id) == {'i': 2}
+
+    # A reset starts a new history
+    store.reset(session_id, {'i': 6})
+    assert store.get(session_id) == {'i': 6}
+    assert not store.history(session_id).can_undo
@@ -1,3 +1,7 @@
+import json
+import pickle
+
+import pharmpy.modeling
 import pytest
 from pharmpy.mfl import IIV, Covariance, Covariate, ModelFeatures
 from pharmpy.modeling import (
@@ -11,10 +15,17 @@ from pharmpy.modeling import (
     has_proportional_error_model,
     has_zero_order_absorption,
     load_example_model,
+    set_dataset,
 )
 from pharmpy.modeling.mfl import get_model_features
 
-from modelbuilder.internals.model_state import ModelState, generate_code, update_model_state
+from modelbuilder.internals.model_state import (
+    ModelState,
+    _stage_cache,
+    _state_cache,
+    generate_code,
+    update_model_state,
+)
 
 
 def test_model_state_init():
@@ -226,3 +237,155 @@ def test_generate_code(language, expected):
     model_state = ModelState.create('iv')
     funcs, _ = model_state.list_functions()
     assert generate_code(funcs, language) == expected
+
+
+def test_list_functions_reuses_stages(monkeypatch):
+    example_model = load_example_model('pheno')
+    dataset, datainfo = example_model.dataset, example_model.datainfo
+    model_state = ModelState.create('iv')
+    funcs, model = model_state.list_functions(dataset, datainfo)
+    funcs_cached, model_cached = model_state.list_functions(dataset, datainfo)
+    assert model_cached is model
+    assert funcs_cached == funcs
+
+    def _fail(*args, **kwargs):
+        raise AssertionError('structural stage should be cached')
+
+    model_state_new = update_model_state(model_state, 'COVARIATE(CL,WGT,exp)', type='covariate')
+    monkeypatch.setattr(ModelState, '_get_mfl_funcs', _fail)
+    funcs_new, model_new = model_state_new.list_functions(dataset, datainfo)
+    assert has_covariate_effect(model_new, 'CL', 'WGT')
+    monkeypatch.undo()
+
+    _stage_cache.clear()
+    funcs_uncached, model_uncached = model_state_new.list_functions(dataset, datainfo)
+    assert model_uncached == model_new
+    assert generate_code(funcs_uncached, 'python') == generate_code(funcs_new, 'python')
+
+
+def test_dataset_attached_once(monkeypatch):
+    dataset = load_example_model('pheno').dataset
+    model_state = ModelState.create('iv').replace(dataset=dataset)
+    model = model_state.generate_model()
+    assert len(model.dataset) == len(dataset)
+
+    calls = []
+
+    def _set_dataset(*args, **kwargs):
+        calls.append(kwargs)
+        return set_dataset(*args, **kwargs)
+
+    monkeypatch.setattr(pharmpy.modeling, 'set_dataset', _set_dataset)
+    _stage_cache.clear()
+    model_state_oral = ModelState.create('oral').replace(dataset=dataset)
+    model_oral = model_state_oral.generate_model()
+    assert model_oral.dataset is model.dataset
+    assert not calls
+
+    # A covariate is in the attached dataset, only the covariate stage and the stages after it
+    # are run again
+    def _fail(*args, **kwargs):
+        raise AssertionError('structural stage should be cached')
+
+    monkeypatch.setattr(ModelState, '_get_mfl_funcs', _fail)
+    model_state_cov = update_model_state(
+        model_state_oral, 'COVARIATE(CL,WGT,exp)', type='covariate'
+    )
+    model_cov = model_state_cov.generate_model()
+    assert has_covariate_effect(model_cov, 'CL', 'WGT')
+    assert model_cov.dataset is model.dataset
+    assert not calls
+    monkeypatch.undo()
+
+    # A new upload is a new dataset (an equal model state would reuse the generated model)
+    _state_cache.clear()
+    model_new = ModelState.create('iv').replace(dataset=dataset.copy()).generate_model()
+    assert model_new.dataset is not model.dataset
+
+
+def test_dataset_columns():
+    dataset = load_example_model('pheno').dataset.assign(NOTE='text')
+    model = ModelState.create('iv').replace(dataset=dataset).generate_model()
+    assert list(model.dataset.columns) == list(dataset.columns.drop('NOTE'))
+
+
+def test_fingerprint():
+    model_state = ModelState.create('oral')
+    assert model_state.fingerprint == ModelState.create('oral').fingerprint
+    assert model_state == ModelState.create('oral')
+    assert model_state != ModelState.create('iv')
+    assert len({model_state, ModelState.create('oral')}) == 1
+
+    model_state_mm = update_model_state(model_state, 'ELIMINATION(MM)', type='structural')
+    assert model_state_mm != model_state
+    model_state_fo = update_model_state(model_state_mm, 'ELIMINATION(FO)', type='structural')
+    assert model_state_fo == model_state.replace(parameters=model_state_fo.parameters)
+
+    # Fields that were not compared before
+    dataset = load_example_model('pheno').dataset
+    model_state_data = model_state.replace(dataset=dataset)
+    assert model_state_data != model_state
+    assert model_state_data == model_state.replace(dataset=dataset.copy())
+    assert model_state != model_state.replace(individual_parameters=['CL'])
+
+    # IOV parameter lists from the data table are strings
+    iov = [{'occ': 'FA1', 'list_of_parameters': ['CL'], 'distribution': 'same-as-iiv'}]
+    iov_str = [{'occ': 'FA1', 'list_of_parameters': "['CL']", 'distribution': 'same-as-iiv'}]
+    assert model_state.replace(iov=iov) == model_state.replace(iov=iov_str)
+
+
+def test_model_state_immutable():
+    model_state = ModelState.create('oral')
+    with pytest.raises(AttributeError):
+        model_state.dataset = None
+    assert not hasattr(model_state, '__dict__')
+    assert model_state.replace() is model_state
+    with pytest.raises(TypeError):
+        model_state.replace(datset=None)
+
+    model_state_new = model_state.replace(model_format='generic')
+    assert model_state_new.mfl is model_state.mfl
+    assert model_state_new.parameters is model_state.parameters
+    assert pickle.loads(pickle.dumps(model_state_new)) == model_state_new
+
+    # Structural changes add parameters, which are synced from the generated model
+    model_state_mm = update_model_state(model_state, 'PERIPHERALS(1)', type='structural')
+    assert len(model_state_mm.parameters) == 0
+    model_state_synced = model_state_mm.sync_with_model()
+    assert model_state_synced.parameters == model_state_mm.generate_model().parameters
+    assert len(model_state_mm.parameters) == 0
+
+
+def test_generated_model_cached_by_state():
+    model_state = update_model_state(ModelState.create('oral'), 'PERIPHERALS(2)', type='structural')
+    model = model_state.generate_model()
+    _stage_cache.clear()
+    model_state_equal = update_model_state(
+        ModelState.create('oral'), 'PERIPHERALS(2)', type='structural'
+    )
+    assert model_state_equal.generate_model() is model
+
+
+def test_sync_with_model_shares_model():
+    model_state = update_model_state(ModelState.create('iv'), 'PERIPHERALS(1)', type='structural')
+    funcs, model = model_state.list_functions()
+    model_state_synced = model_state.sync_with_model()
+    assert model_state_synced != model_state
+    assert model_state_synced.generate_model() is model
+
+    _stage_cache.clear()
+    _state_cache.clear()
+    funcs_synced, model_synced = model_state_synced.list_functions()
+    assert model_synced == model
+    assert generate_code(funcs_synced, 'python') == generate_code(funcs, 'python')
+
+
+def test_model_state_to_dict():
+    model_state = update_model_state(ModelState.create('oral'), 'PERIPHERALS(1)', type='structural')
+    model_state = update_model_state(model_state.sync_with_model(), error={1: 'comb'})
+    d = json.loads(json.dumps(model_state.to_dict()))
+    assert ModelState.from_dict(d) == model_state
+
+    dataset = load_example_model('pheno').dataset
+    with pytest.raises(TypeError):
+        model_state.replace(dataset=dataset).to_dict()
@@ -0,0 +1,52 @@
+import modelbuilder.config as config
+from modelbuilder.app import app
+from modelbuilder.internals.dataset import DatasetHandle, DatasetStore
+from modelbuilder.internals.model_state import ModelState
+from modelbuilder.internals.session import new_session_id
+
+
+def test_upload_dataset(tmp_path, monkeypatch):
+    store = DatasetStore(tmp_path)
+    monkeypatch.setattr('modelbuilder.routes.dataset_store', store)
+    client = app.server.test_client()
+    response = client.post('/_modelbuilder/datasets?filename=data.csv', data=b'ID,DV\n1,2\n')
+    assert response.status_code == 200
+    assert response.json['filename'] == 'data.csv'
+    assert list(store.load(response.json['id']).columns) == ['ID', 'DV']
+
+
+def test_upload_dataset_too_large(tmp_path, monkeypatch):
+    store = DatasetStore(tmp_path, max_upload_size=4)
+    monkeypatch.setattr('modelbuilder.routes.dataset_store', store)
+    client = app.server.test_client()
+    response = client.post('/_modelbuilder/datasets', data=b'ID,DV\n1,2\n')
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_dataset_expired(tmp_path, monkeypatch):
+    store = DatasetStore(tmp_path)
+    monkeypatch.setattr('modelbuilder.internals.dataset.dataset_store', store)
+    session_id = new_session_id()
+    model_state = ModelState.create('iv').replace(dataset=DatasetHandle('0' * 64, 'data.csv'))
+    config.session_store.commit(session_id, model_state)
+    client = app.server.test_client()
+    body = {
+        'output': '..output-model.value...output-python.value...output-r.value..',
+        'outputs': [
+            {'id': 'output-model', 'property': 'value'},
+            {'id': 'output-python', 'property': 'value'},
+            {'id': 'output-r', 'property': 'value'},
+        ],
+        'inputs': [
+            {'id': 'model-state-token', 'property': 'data', 'value': 'token'},
+            {'id': 'model-view-tabs', 'property': 'value', 'value': 'output-model'},
+        ],
+        'state': [{'id': 'session-id', 'property': 'data', 'value': session_id}],
+        'changedPropIds': ['model-state-token.data'],
+    }
+    response = client.post('/_dash-update-component', json=body)
+    assert response.status_code == 200
+    assert response.json['sideUpdate'] == {
+        'dataset-path': {'value': 'Dataset expired, please re-upload'}
+    }
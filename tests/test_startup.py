@@ -0,0 +1,45 @@
+import json
+import subprocess
+import sys
+
+from modelbuilder.internals.model_state import ModelState, update_model_state
+
+CODE = '''
+import sys
+import modelbuilder.app
+modules = ['pandas', 'pharmpy.mfl', 'pharmpy.model', 'pharmpy.modeling', 'pywrapr']
+print(','.join(m for m in modules if m in sys.modules))
+'''
+
+
+def test_app_import_is_lazy():
+    # pandas and pharmpy are slow to import and should only be imported when used
+    result = subprocess.run(
+        [sys.executable, '-c', CODE], check=True, capture_output=True, text=True
+    )
+    assert result.stdout.strip() == ''
+
+
+BUILD_CODE = '''
+import sys
+from modelbuilder.cli import main
+main(['build', sys.argv[1], '--output-dir', sys.argv[2]])
+print(','.join(m for m in ['dash', 'dash_bootstrap_components', 'flask'] if m in sys.modules))
+'''
+
+
+def test_build_does_not_import_dash(tmp_path):
+    model_state = update_model_state(ModelState.create('iv'), error={1: 'add'})
+    state_path = tmp_path / 'state.json'
+    state_path.write_text(json.dumps(model_state.to_dict()))
+    result = subprocess.run(
+        [sys.executable, '-c', BUILD_CODE, str(state_path), str(tmp_path / 'out')],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert result.stdout.splitlines()[-1] == ''
+    names = sorted(path.name for path in (tmp_path / 'out').iterdir())
+    assert names == ['start.ctl', 'start_pharmpy.py', 'start_pharmr.R']
+    python_code = (tmp_path / 'out' / 'start_pharmpy.py').read_text()
+    assert 'set_additive_error_model' in python_code
@@ -0,0 +1,95 @@
+import modelbuilder.config as config
+from modelbuilder.app import app
+from modelbuilder.internals.model_state import ModelState, update_model_state
+from modelbuilder.internals.session import new_session_id
+
+
+def _update(client, input_id, value, session_id):
+    # Calls the callback with input_id as input and model-state-token as output like the browser
+    deps = client.get('/_dash-dependencies').json
+    dep = next(
+        d
+        for d in deps
+        if 'model-state-token.data' in d['output'] and any(i['id'] == input_id for i in d['inputs'])
+    )
+    inputs = [dict(i, value=value if i['id'] == input_id else None) for i in dep['inputs']]
+    outputs = [
+        {'id': output.split('.')[0], 'property': output.split('.')[1].split('@')[0]}
+        for output in dep['output'].strip('.').split('...')
+    ]
+    body = {
+        'output': dep['output'],
+        'outputs': outputs if dep['output'].startswith('..') else outputs[0],
+        'inputs': inputs,
+        'state': [
+            dict(s, value=session_id if s['id'] == 'session-id' else None) for s in dep['state']
+        ],
+        'changedPropIds': [f'{input_id}.{dep["inputs"][0]["property"]}'],
+    }
+    response = client.post('/_dash-update-component', json=body)
+    assert response.status_code in (200, 204)
+    return response.json['response'] if response.status_code == 200 else None
+
+
+def test_undo_sets_radios():
+    session_id = new_session_id()
+    model_state = ModelState.create('oral')
+    config.session_store.commit(session_id, model_state)
+    model_state_2 = update_model_state(model_state, 'PERIPHERALS(2)', type='structural')
+    config.session_store.commit(session_id, model_state_2)
+    client = app.server.test_client()
+
+    response = _update(client, 'undo-btn', 1, session_id)
+    assert response['peripheral-radio'] == {'value': 0}
+    assert response['abs_rate-radio'] == {'value': 'FO'}
+    assert response['abs_delay_radio'] == {'value': 'LAGTIME(OFF);TRANSITS(0)'}
+    assert config.session_store.get(session_id) == model_state
+
+    # The radio callback is triggered by the new value and does not commit, so the undone state
+    # can be redone
+    assert _update(client, 'peripheral-radio', 0, session_id) is None
+    assert config.session_store.get(session_id) == model_state
+    assert config.session_store.history(session_id).can_redo
+
+
+def test_undo_across_route_change():
+    session_id = new_session_id()
+    model_state = ModelState.create('oral')
+    config.session_store.commit(session_id, model_state)
+    config.session_store.commit(
+        session_id, update_model_state(model_state, 'PERIPHERALS(1)', type='structural')
+    )
+    client = app.server.test_client()
+
+    # The route radio would show oral for an undone iv state, so the route change starts a new
+    # history
+    _update(client, 'route-radio', 'iv', session_id)
+    assert config.session_store.get(session_id).model_type == 'iv'
+    assert not config.session_store.history(session_id).can_undo
+    assert _update(client, 'undo-btn', 1, session_id) is None
+    assert config.session_store.get(session_id).model_type == 'iv'
+
+
+def test_undo_sets_error_model_and_name():
+    session_id = new_session_id()
+    model_state = ModelState.create('oral')
+    config.session_store.commit(session_id, model_state)
+    model_state_2 = update_model_state(model_state, model_attrs={'name': 'run2'})
+    model_state_2 = update_model_state(model_state_2, error={1: 'comb', 2: ''})
+    model_state_2 = update_model_state(model_state_2, error={1: 'power', 2: ''})
+    config.session_store.commit(session_id, model_state_2)
+    config.session_store.commit(session_id, model_state_2.replace(model_format='generic'))
+    client = app.server.test_client()
+
+    response = _update(client, 'undo-btn', 1, session_id)
+    assert response['base-type-radio'] == {'value': 'comb'}
+    assert response['additional-types-checklist'] == {'value': ['power']}
+    assert response['modelformat'] == {'value': 'nonmem'}
+    assert response['model-name'] == {'value': 'run2'}
+    assert 'history-token' in response
+    assert config.session_store.get(session_id) == model_state_2
+
+    assert _update(client, 'additional-types-checklist', ['power'], session_id) is None
+    assert _update(client, 'model-name', 'run2', session_id) is None
+    assert config.session_store.get(session_id) == model_state_2
+    assert config.session_store.history(session_id).can_redo